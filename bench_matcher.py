@@ -0,0 +1,69 @@
+"""Pattern lookup benchmark: PatternIndex vs. the old front-to-back scan.
+
+    python bench_matcher.py [sizes...]
+
+Lookup time of the index should stay flat as the pattern count grows, while the
+linear scan grows with it (the scan is only timed up to 10^4 patterns).
+"""
+import random
+import sys
+import time
+
+from engine import PatternIndex
+
+DEFAULT_SIZES = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+LINEAR_LIMIT = 10 ** 4
+QUERIES = 2000
+
+
+def build_patterns(count):
+    response = "Synthetic response"
+    for i in range(count):
+        keywords = [f"topic{i}", f"subject{i}x"]
+        yield {'input_pattern': '|'.join(keywords), 'response': response, 'keywords': keywords}
+
+
+def build_queries(count, rng):
+    queries = []
+    for _ in range(QUERIES):
+        if rng.random() < 0.5:
+            queries.append(f"tell me about topic{rng.randrange(count)} please")
+        else:
+            queries.append("nothing in here should match at all, really")
+    return queries
+
+
+def linear_match(patterns, text):
+    for pattern_data in patterns:
+        if any(part in text for part in pattern_data['input_pattern'].split('|')):
+            return pattern_data
+    return None
+
+
+def time_lookups(match, queries):
+    start = time.perf_counter()
+    for query in queries:
+        match(query)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main(sizes):
+    rng = random.Random(42)
+    print(f"{'patterns':>10} {'build s':>9} {'index us':>10} {'linear us':>11}")
+    for count in sizes:
+        start = time.perf_counter()
+        index = PatternIndex(build_patterns(count))
+        build = time.perf_counter() - start
+        queries = build_queries(count, rng)
+
+        indexed = time_lookups(index.match, queries)
+        linear = '-'
+        if count <= LINEAR_LIMIT:
+            patterns = list(index)
+            linear = f"{time_lookups(lambda q: linear_match(patterns, q), queries):.1f}"
+        print(f"{count:>10} {build:>9.2f} {indexed:>10.1f} {linear:>11}")
+        del index
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,250 @@
+"""Headless benchmark and regression suite for the SelfLearningAI hot paths.
+
+    python benchmark.py [--sizes 1000 10000 50000] [--backend json|sqlite]
+                        [--baseline benchmark_baseline.json] [--save-baseline]
+                        [--threshold 0.25]
+
+For every size a model is trained on that many seeded synthetic turns, then a
+seeded query workload is replayed against it. The suite reports throughput and
+latency percentiles for learn_from_conversation, extract_keywords and
+generate_response, the time to save and load the knowledge, and the peak
+memory (tracemalloc) while building the model.
+
+Calls are timed in batches of BATCH calls. extract_keywords and
+generate_response are replayed REPEATS times and keep the fastest pass of
+every batch, and save and load keep their fastest of REPEATS runs, so the
+percentiles are over per-call batch means rather than single calls. The
+warm-up uses its own queries and the analysis cache is cleared before every
+generate_response batch, so the timings measure the lookup path.
+
+--save-baseline writes the results to the baseline file. Without it, the run
+is compared with an existing baseline and exits with status 1 if a metric got
+worse by more than --threshold (25% by default) and by more than its absolute
+NOISE_FLOOR. Timings are only comparable on the same machine. With the sqlite
+backend, peak_mb covers Python allocations only, not SQLite's own page cache.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from engine import MODEL_NAMES, create_storage
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+QUERIES = 2000
+WARMUP = 200
+BATCH = 50
+REPEATS = 5
+LOWER_IS_BETTER = ('p50_us', 'save_s', 'load_s', 'peak_mb')
+HIGHER_IS_BETTER = ('ops_per_s',)
+# Smallest change worth reporting, in the metric's unit; ops_per_s is compared
+# as microseconds per call.
+NOISE_FLOOR = {'p50_us': 0.25, 'ops_per_s': 0.25, 'save_s': 0.02, 'load_s': 0.02, 'peak_mb': 0.5}
+
+
+class Workload:
+    """Seeded synthetic conversations: a Zipf-like vocabulary of pseudo-words."""
+
+    def __init__(self, seed, vocabulary_size=5000, responses=200):
+        self.rng = random.Random(seed)
+        syllables = [c + v for c in 'bcdfgklmnprstvz' for v in 'aeiou']
+        self.words = [''.join(self.rng.choice(syllables) for _ in range(self.rng.randint(1, 4)))
+                      for _ in range(vocabulary_size)]
+        self.weights = [1 / (rank + 1) for rank in range(vocabulary_size)]
+        self.responses = [f"Synthetic response number {i}." for i in range(responses)]
+
+    def sentence(self):
+        return ' '.join(self.rng.choices(self.words, self.weights, k=self.rng.randint(3, 12)))
+
+    def turns(self, count):
+        for i in range(count):
+            feedback = self.rng.choices([None, 'positive', 'negative'], [85, 10, 5])[0]
+            timestamp = f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}T12:00:00"
+            yield self.sentence(), self.rng.choice(self.responses), feedback, timestamp
+
+    def queries(self, count):
+        greetings = ["hello there", "how are you", "thanks a lot", "tell me a joke"]
+        return [self.rng.choice(greetings) if self.rng.random() < 0.1 else self.sentence() for _ in range(count)]
+
+
+def summarize(samples, calls):
+    total = sum(sample * count for sample, count in zip(samples, calls))
+    samples = sorted(samples)
+    percentile = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] * 1e6
+    return {
+        'ops_per_s': sum(calls) / total if total else 0.0,
+        'p50_us': percentile(0.5),
+        'p90_us': percentile(0.9),
+        'p99_us': percentile(0.99),
+    }
+
+
+def timed(func, args_list, repeats=1, reset=None):
+    batches = [args_list[i:i + BATCH] for i in range(0, len(args_list), BATCH)]
+    best = [math.inf] * len(batches)
+    for _ in range(repeats):
+        for i, batch in enumerate(batches):
+            if reset:
+                reset()
+            started = time.perf_counter()
+            for args in batch:
+                func(*args)
+            best[i] = min(best[i], (time.perf_counter() - started) / len(batch))
+    return summarize(best, [len(batch) for batch in batches])
+
+
+def best_time(func, cleanup=None, repeats=REPEATS):
+    best = math.inf
+    for _ in range(repeats):
+        started = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - started)
+        if cleanup:
+            cleanup(value)
+    return best
+
+
+def open_models(backend, workdir):
+    path = os.path.join(workdir, 'ai_knowledge.db' if backend == 'sqlite' else 'ai_knowledge.json')
+    storage = create_storage(backend, path)
+    models = {name: storage.create_model(name) for name in MODEL_NAMES}
+    storage.load(models)
+    return storage, models
+
+
+def run_size(size, backend, seed):
+    result = {}
+    workdir = tempfile.mkdtemp(prefix='catbot-bench-')
+    try:
+        workload = Workload(seed)
+        turns = list(workload.turns(size))
+        storage, models = open_models(backend, workdir)
+        model = models[MODEL_NAMES[0]]
+        result['learn'] = timed(model.learn_from_conversation, turns)
+
+        queries = [(query,) for query in workload.queries(WARMUP + QUERIES)]
+        warmup, queries = queries[:WARMUP], queries[WARMUP:]
+        for query in warmup:
+            model.generate_response(*query)
+        result['extract_keywords'] = timed(model.extract_keywords, queries, REPEATS)
+        result['generate_response'] = timed(model.generate_response, queries, REPEATS, model.cache.clear)
+
+        result['save_s'] = best_time(storage.snapshot)
+        storage.close()
+
+        def load():
+            storage, models = open_models(backend, workdir)
+            models[MODEL_NAMES[0]].get_stats()
+            return storage
+        result['load_s'] = best_time(load, lambda storage: storage.close())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    workdir = tempfile.mkdtemp(prefix='catbot-bench-')
+    try:
+        tracemalloc.start()
+        storage, models = open_models(backend, workdir)
+        for turn in turns:
+            models[MODEL_NAMES[0]].learn_from_conversation(*turn)
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        storage.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def flatten(results):
+    for size, result in results.items():
+        for name, value in result.items():
+            if isinstance(value, dict):
+                for metric, number in value.items():
+                    yield f"{size}/{name}/{metric}", metric, number
+            else:
+                yield f"{size}/{name}", name, value
+
+
+def cost(metric, value):
+    # Lower is better; throughput becomes microseconds per call.
+    return 1e6 / value if metric in HIGHER_IS_BETTER else value
+
+
+def compare(results, baseline, threshold):
+    previous = {key: value for key, _, value in flatten(baseline['results'])}
+    regressions = []
+    for key, metric, value in flatten(results):
+        old = previous.get(key)
+        if not old or not value or metric not in NOISE_FLOOR:
+            continue
+        before, after = cost(metric, old), cost(metric, value)
+        if after > before * (1 + threshold) and after - before > NOISE_FLOOR[metric]:
+            regressions.append((key, old, value))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'size':>7} {'stage':<18} {'ops/s':>10} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9}")
+    for size, result in results.items():
+        for stage in ('learn', 'extract_keywords', 'generate_response'):
+            r = result[stage]
+            print(f"{size:>7} {stage:<18} {r['ops_per_s']:>10.0f} {r['p50_us']:>9.1f} "
+                  f"{r['p90_us']:>9.1f} {r['p99_us']:>9.1f}")
+        print(f"{size:>7} save {result['save_s']:.3f}s | load {result['load_s']:.3f}s | "
+              f"peak {result['peak_mb']:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SelfLearningAI hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="learned turns per model")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help="write this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown before failing")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        results[str(size)] = run_size(size, args.backend, args.seed)
+    print_results(results)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'backend': args.backend,
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('backend') != args.backend:
+        print(f"Baseline was recorded with the {baseline.get('backend')} backend; not comparing")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for key, old, new in regressions:
+        print(f"REGRESSION {key}: {old:.3f} -> {new:.3f}")
+    if regressions:
+        return 1
+    print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
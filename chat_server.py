@@ -0,0 +1,220 @@
+"""Headless chat server: many sessions sharing one set of SelfLearningAI models.
+
+    python chat_server.py [--host 127.0.0.1] [--port 8765] [--backend json|sqlite]
+
+    POST /chat      {"message": "...", "session": "...", "model": "Neural-1"}
+    POST /feedback  {"session": "...", "feedback": "positive" | "negative"}
+    GET  /stats
+
+Replies are generated on the request thread without taking any model lock.
+Learning steps go to one write queue per model and are applied in batches by
+that model's writer thread, so a chat never waits for a learning write.
+"""
+import argparse
+import json
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from engine import MODEL_NAMES, create_storage
+
+
+class LearningQueue:
+    """Applies learning steps for one model on its own thread, in batches."""
+
+    def __init__(self, model, batch_size=64):
+        self.model = model
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f"learn-{model.name}", daemon=True)
+        self.thread.start()
+
+    def put(self, user_input, bot_response, user_feedback=None):
+        self.queue.put((user_input, bot_response, user_feedback))
+
+    def _run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            with self.model.lock:
+                for item in batch:
+                    if item is None:
+                        running = False
+                        break
+                    try:
+                        self.model.learn_from_conversation(*item)
+                    except Exception as e:
+                        print(f"Error learning in {self.model.name}: {e}")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class ChatSession:
+    def __init__(self, session_id, model_name, context_size=10):
+        self.id = session_id
+        self.model_name = model_name
+        self.conversation_context = deque(maxlen=context_size)
+        self.last_user_message = None
+        self.last_bot_response = None
+        self.lock = threading.Lock()
+
+
+class ChatService:
+    """Sessions and models behind the server, independent of the transport."""
+
+    def __init__(self, storage, default_model=MODEL_NAMES[0], max_sessions=10000, metrics=False):
+        self.storage = storage
+        self.default_model = default_model
+        self.max_sessions = max_sessions
+        self.models = {name: storage.create_model(name) for name in MODEL_NAMES}
+        for model in self.models.values():
+            model.metrics.enabled = metrics
+        self.storage.load(self.models)
+        self.storage.start()
+        self.learners = {name: LearningQueue(model) for name, model in self.models.items()}
+        self.sessions = OrderedDict()
+        self._sessions_lock = threading.Lock()
+
+    def get_session(self, session_id=None, model_name=None):
+        with self._sessions_lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = ChatSession(session_id or uuid.uuid4().hex, self.default_model)
+                self.sessions[session.id] = session
+                if len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            else:
+                self.sessions.move_to_end(session.id)
+        if model_name:
+            if model_name not in self.models:
+                raise ValueError(f"Unknown model: {model_name}")
+            session.model_name = model_name
+        return session
+
+    def chat(self, message, session_id=None, model_name=None):
+        message = (message or '').strip()
+        if not message:
+            raise ValueError("Empty message")
+        session = self.get_session(session_id, model_name)
+        with session.lock:
+            model = self.models[session.model_name]
+            response = model.generate_response(message, list(session.conversation_context)[-5:])
+            session.conversation_context.append(message)
+            session.conversation_context.append(response)
+            session.last_user_message = message
+            session.last_bot_response = response
+        self.learners[session.model_name].put(message, response)
+        return {'session': session.id, 'model': session.model_name, 'response': response}
+
+    def feedback(self, session_id, feedback):
+        if feedback not in ('positive', 'negative'):
+            raise ValueError("Feedback must be 'positive' or 'negative'")
+        session = self.get_session(session_id)
+        with session.lock:
+            if not (session.last_user_message and session.last_bot_response):
+                raise ValueError("No recent message to rate")
+            self.learners[session.model_name].put(session.last_user_message, session.last_bot_response, feedback)
+        return {'session': session.id, 'model': session.model_name, 'feedback': feedback}
+
+    def stats(self):
+        stats = {}
+        for name, model in self.models.items():
+            stats[name] = model.get_stats()
+            stats[name]['pending_learning'] = self.learners[name].queue.qsize()
+            if model.metrics.enabled:
+                stats[name]['metrics'] = model.metrics.summary()
+        stats['sessions'] = len(self.sessions)
+        return stats
+
+    def close(self):
+        for learner in self.learners.values():
+            learner.close()
+        self.storage.close()
+
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, self.server.service.stats())
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            service = self.server.service
+            if self.path == '/chat':
+                result = service.chat(body.get('message'), body.get('session'), body.get('model'))
+            elif self.path == '/feedback':
+                result = service.feedback(body.get('session'), body.get('feedback'))
+            else:
+                self.send_json(404, {'error': 'Not found'})
+                return
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+            return
+        except Exception as e:
+            print(f"Error handling {self.path}: {e}")
+            self.send_json(500, {'error': str(e)})
+            return
+        self.send_json(200, result)
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ChatHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def create_server(service, host='127.0.0.1', port=8765, verbose=False):
+    server = ChatHTTPServer((host, port), ChatRequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless multi-session chat server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--knowledge', help="knowledge file (default ai_knowledge.json / ai_knowledge.db)")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    parser.add_argument('--metrics', action='store_true', help="include per-stage timings in /stats")
+    args = parser.parse_args()
+
+    service = ChatService(create_storage(args.backend, args.knowledge), metrics=args.metrics)
+    server = create_server(service, args.host, args.port, args.verbose)
+    print(f"Serving {', '.join(MODEL_NAMES)} on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
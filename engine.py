@@ -0,0 +1,1925 @@
+"""Self-learning chat engine: models, knowledge indexes and storage backends.
+
+Nothing here imports tkinter, so chat_server.py, train.py and the benchmarks
+can use the engine headless. The desktop window lives in main.py.
+"""
+import json
+import os
+import sys
+import struct
+import sqlite3
+import time
+from datetime import datetime
+import random
+import re
+import math
+import heapq
+import itertools
+import bisect
+import threading
+from array import array
+from collections import defaultdict, OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+MODEL_NAMES = ('Neural-1', 'Neural-2', 'Neural-3', 'Adaptive')
+ENSEMBLE_NAME = 'Ensemble'
+
+
+class PatternIndex:
+    """Ordered pattern list with a hash index over every '|' alternative.
+
+    Alternatives are bucketed by length, so a lookup slices the input once per
+    distinct length instead of testing every pattern. The earliest pattern that
+    matches wins, exactly like a front-to-back scan of the list, so identical
+    (input_pattern, response) pairs are only stored once. A pattern is kept as
+    its (input_pattern, response) key and a tuple of keywords, and the dict
+    form is only built when it is read.
+    """
+
+    def __init__(self, patterns=()):
+        self._entries = {}
+        self._keys = {}
+        self._alternatives = {}
+        self._lengths = defaultdict(int)
+        self._next_id = 0
+        self.extend(patterns)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter([self._pattern(entry) for entry in list(self._entries.values())])
+
+    def append(self, pattern_data):
+        key = (pattern_data['input_pattern'], pattern_data['response'])
+        if key in self._keys:
+            return None
+        pattern_id = self._next_id
+        self._next_id += 1
+        self._entries[pattern_id] = (key, tuple(pattern_data.get('keywords', ())))
+        self._keys[key] = pattern_id
+        for part in set(key[0].split('|')):
+            ids = self._alternatives.get(part)
+            if ids is None:
+                self._alternatives[part] = [pattern_id]
+                self._lengths[len(part)] += 1
+            else:
+                ids.append(pattern_id)
+        return pattern_id
+
+    def extend(self, patterns):
+        for pattern_data in patterns:
+            self.append(pattern_data)
+
+    def remove(self, pattern_id):
+        key, _ = self._entries.pop(pattern_id)
+        del self._keys[key]
+        for part in set(key[0].split('|')):
+            ids = self._alternatives[part]
+            if len(ids) == 1:
+                del self._alternatives[part]
+                self._lengths[len(part)] -= 1
+                if not self._lengths[len(part)]:
+                    del self._lengths[len(part)]
+            else:
+                ids.remove(pattern_id)
+
+    def evict_oldest(self, count, keep=()):
+        victims = []
+        for pattern_id, (key, _) in list(self._entries.items()):
+            if len(victims) >= count:
+                break
+            if key not in keep:
+                victims.append(pattern_id)
+        for pattern_id in victims:
+            self.remove(pattern_id)
+        return len(victims)
+
+    def match(self, text):
+        best = None
+        size = len(text)
+        for length in tuple(self._lengths):
+            if length > size:
+                continue
+            candidates = {text[i:i + length] for i in range(size - length + 1)}
+            for candidate in candidates:
+                first = self._alternatives.get(candidate, ())[:1]
+                if first and (best is None or first[0] < best):
+                    best = first[0]
+        entry = self._entries.get(best) if best is not None else None
+        return self._pattern(entry) if entry is not None else None
+
+    def _pattern(self, entry):
+        (input_pattern, response), keywords = entry
+        return {'input_pattern': input_pattern, 'response': response, 'keywords': list(keywords)}
+
+
+class KnowledgeEntry:
+    """One (keyword, response) entry of a KnowledgeIndex."""
+
+    __slots__ = ('score', 'count', 'seq', 'context', 'timestamp')
+
+    def __init__(self, score, count, seq, context, timestamp):
+        self.score = score
+        self.count = count
+        self.seq = seq
+        self.context = context
+        self.timestamp = timestamp
+
+
+class KnowledgeIndex:
+    """Knowledge records grouped by (keyword, response) with running scores.
+
+    Repeated records for the same response are folded into one entry whose
+    score is the sum of their scores. Entries are slotted KnowledgeEntry
+    objects; record dicts are only built when they are read. Each keyword remembers its best response (highest score,
+    then oldest), so best() is a lookup; only a score drop on the best entry
+    rescans that keyword.
+    """
+
+    def __init__(self, knowledge=None):
+        self._entries = {}
+        self._best = {}
+        self._seq = 0
+        self._records = 0
+        if knowledge:
+            self.update(knowledge)
+
+    def __contains__(self, keyword):
+        return keyword in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def record_count(self):
+        return self._records
+
+    def get(self, keyword):
+        entries = self._entries.get(keyword)
+        return [self._record(response, entry) for response, entry in list(entries.items())] if entries else []
+
+    def items(self):
+        for keyword in list(self._entries):
+            yield keyword, self.get(keyword)
+
+    def values(self):
+        for _, records in self.items():
+            yield records
+
+    def update(self, knowledge):
+        for keyword, records in knowledge.items():
+            for record in records:
+                self.add(keyword, record)
+
+    def add(self, keyword, record):
+        entries = self._entries.get(keyword)
+        if entries is None:
+            entries = self._entries[keyword] = {}
+        response = record['response']
+        score = record.get('score', 0)
+        entry = entries.get(response)
+        if entry is not None:
+            entry.score += score
+            entry.count += record.get('count', 1)
+            if record.get('timestamp', '') >= (entry.timestamp or ''):
+                entry.context = record.get('context', entry.context)
+                entry.timestamp = record.get('timestamp', entry.timestamp)
+        else:
+            entry = KnowledgeEntry(score, record.get('count', 1), self._seq, record.get('context'),
+                                   record.get('timestamp'))
+            entries[response] = entry
+            self._seq += 1
+            self._records += 1
+        
+        best = self._best.get(keyword)
+        if best is None or (best == response and score < 0):
+            self._rank(keyword)
+        elif best != response:
+            top = entries[best]
+            if entry.score > top.score or (entry.score == top.score and entry.seq < top.seq):
+                self._best[keyword] = response
+
+    def best(self, keyword):
+        try:
+            response = self._best[keyword]
+            return self._record(response, self._entries[keyword][response])
+        except KeyError:
+            return None
+
+    def compact(self, max_records, half_life_days, now=None):
+        now = now or datetime.now()
+        victims = []
+        ranked = []
+        for keyword, entries in self._entries.items():
+            for response, entry in entries.items():
+                if entry.score <= 0:
+                    victims.append((keyword, response))
+                else:
+                    ranked.append((decayed_score(entry.score, entry.timestamp, half_life_days, now),
+                                   entry.seq, keyword, response))
+        if len(ranked) > max_records:
+            victims.extend((keyword, response) for _, _, keyword, response
+                           in heapq.nsmallest(len(ranked) - max_records, ranked))
+        
+        touched = set()
+        for keyword, response in victims:
+            del self._entries[keyword][response]
+            touched.add(keyword)
+        for keyword in touched:
+            if self._entries[keyword]:
+                self._rank(keyword)
+            else:
+                del self._entries[keyword]
+                del self._best[keyword]
+        self._records -= len(victims)
+        return len(victims)
+
+    def _rank(self, keyword):
+        entries = self._entries[keyword]
+        self._best[keyword] = min(entries, key=lambda response: (-entries[response].score, entries[response].seq))
+
+    def _record(self, response, entry):
+        return {'response': response, 'context': entry.context, 'timestamp': entry.timestamp,
+                'score': entry.score, 'count': entry.count}
+
+
+def decayed_score(score, timestamp, half_life_days, now=None):
+    try:
+        age = ((now or datetime.now()) - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+    except (TypeError, ValueError):
+        age = 0
+    return score * 0.5 ** (max(age, 0) / half_life_days)
+
+
+def _le_bytes(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _le_array(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class Vocabulary:
+    """Interned tokens with dense integer ids."""
+
+    __slots__ = ('_ids', '_tokens')
+
+    def __init__(self, tokens=()):
+        self._ids = {}
+        self._tokens = []
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, token):
+        return token in self._ids
+
+    def add(self, token):
+        token_id = self._ids.get(token)
+        if token_id is None:
+            token = sys.intern(token)
+            token_id = len(self._tokens)
+            self._tokens.append(token)
+            self._ids[token] = token_id
+        return token_id
+
+    def get(self, token):
+        return self._ids.get(token)
+
+    def token(self, token_id):
+        return self._tokens[token_id]
+
+    def to_bytes(self):
+        encoded = [token.encode('utf-8') for token in self._tokens]
+        return _le_bytes(array('I', map(len, encoded))) + b''.join(encoded)
+
+    @classmethod
+    def from_bytes(cls, data, size):
+        lengths = _le_array('I', data[:4 * size])
+        vocabulary = cls()
+        offset = 4 * size
+        for length in lengths:
+            vocabulary.add(bytes(data[offset:offset + length]).decode('utf-8'))
+            offset += length
+        return vocabulary, offset
+
+
+class WordAssociations:
+    """Word -> next-word graph over integer token ids.
+
+    Tokens live once in a Vocabulary and every word keeps its successors as a
+    sorted array('I') of ids. to_bytes() writes the vocabulary and the graph in
+    CSR form (offsets plus targets), which from_bytes() reads back without
+    parsing text.
+    """
+
+    __slots__ = ('vocabulary', '_next', '_words', '_count')
+
+    MAGIC = b'CBW1'
+
+    def __init__(self, associations=None):
+        self.vocabulary = Vocabulary()
+        self._next = []
+        self._words = 0
+        self._count = 0
+        if associations:
+            self.update(associations)
+
+    def __contains__(self, word):
+        word_id = self.vocabulary.get(word)
+        return word_id is not None and word_id < len(self._next) and self._next[word_id] is not None
+
+    def __len__(self):
+        return self._words
+
+    def get(self, word):
+        word_id = self.vocabulary.get(word)
+        if word_id is None or word_id >= len(self._next) or self._next[word_id] is None:
+            return set()
+        return {self.vocabulary.token(next_id) for next_id in self._next[word_id]}
+
+    def add(self, word, next_word):
+        word_id = self.vocabulary.add(word)
+        next_id = self.vocabulary.add(next_word)
+        if word_id >= len(self._next):
+            self._next.extend([None] * (word_id + 1 - len(self._next)))
+        
+        next_ids = self._next[word_id]
+        if next_ids is None:
+            self._next[word_id] = array('I', (next_id,))
+            self._words += 1
+        else:
+            i = bisect.bisect_left(next_ids, next_id)
+            if i < len(next_ids) and next_ids[i] == next_id:
+                return
+            next_ids.insert(i, next_id)
+        self._count += 1
+
+    def update(self, associations):
+        for word, next_words in associations.items():
+            for next_word in next_words:
+                self.add(word, next_word)
+
+    def items(self):
+        token = self.vocabulary.token
+        for word_id, next_ids in enumerate(list(self._next)):
+            if next_ids is not None:
+                yield token(word_id), [token(next_id) for next_id in next_ids]
+
+    def count(self):
+        return self._count
+
+    def compact(self, max_associations):
+        """Drop the words with the fewest successors, oldest first, and renumber the vocabulary."""
+        excess = self._count - max_associations
+        if excess <= 0:
+            return 0
+        removed = 0
+        for _, word_id in sorted((len(next_ids), word_id) for word_id, next_ids in enumerate(self._next)
+                                 if next_ids is not None):
+            if removed >= excess:
+                break
+            removed += len(self._next[word_id])
+            self._next[word_id] = None
+            self._words -= 1
+        self._count -= removed
+        
+        used = set()
+        for word_id, next_ids in enumerate(self._next):
+            if next_ids is not None:
+                used.add(word_id)
+                used.update(next_ids)
+        token_ids = {}
+        vocabulary = Vocabulary()
+        for token_id in sorted(used):
+            token_ids[token_id] = vocabulary.add(self.vocabulary.token(token_id))
+        next_lists = [None] * len(vocabulary)
+        for word_id, next_ids in enumerate(self._next):
+            if next_ids is not None:
+                next_lists[token_ids[word_id]] = array('I', (token_ids[next_id] for next_id in next_ids))
+        self.vocabulary, self._next = vocabulary, next_lists
+        return removed
+
+    def to_bytes(self):
+        offsets = array('I', [0])
+        targets = array('I')
+        for next_ids in self._next:
+            if next_ids is not None:
+                targets.extend(next_ids)
+            offsets.append(len(targets))
+        return (struct.pack('<4sIII', self.MAGIC, len(self.vocabulary), len(self._next), len(targets))
+                + self.vocabulary.to_bytes() + _le_bytes(offsets) + _le_bytes(targets))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        magic, vocabulary_size, words, edges = struct.unpack_from('<4sIII', data)
+        if magic != cls.MAGIC:
+            raise ValueError("Not a word association blob")
+        associations = cls()
+        associations.vocabulary, size = Vocabulary.from_bytes(data[16:], vocabulary_size)
+        offset = 16 + size
+        offsets = _le_array('I', data[offset:offset + 4 * (words + 1)])
+        offset += 4 * (words + 1)
+        targets = _le_array('I', data[offset:offset + 4 * edges])
+        
+        associations._next = [
+            targets[offsets[i]:offsets[i + 1]] if offsets[i + 1] > offsets[i] else None
+            for i in range(words)
+        ]
+        associations._words = sum(1 for next_ids in associations._next if next_ids is not None)
+        associations._count = edges
+        return associations
+
+    def load_bytes(self, data):
+        loaded = WordAssociations.from_bytes(data)
+        if not self._count:
+            self.vocabulary, self._next = loaded.vocabulary, loaded._next
+            self._words, self._count = loaded._words, loaded._count
+        else:
+            self.update(dict(loaded.items()))
+
+
+def knowledge_documents(knowledge):
+    documents = {}
+    for records in knowledge.values():
+        for record in records:
+            key = (record.get('context') or '', record['response'])
+            documents[key] = max(documents.get(key, record['score']), record['score'])
+    for (context, response), score in documents.items():
+        yield context, response, score
+
+
+class ContextRetriever:
+    """TF-IDF index over learned contexts for nearest-context retrieval.
+
+    Every distinct (context, response) pair is one document, scored by the sum
+    of its feedback. Documents use log-tf weights normalised at insertion and
+    queries carry the idf (lnc.ltc weighting), so adding a document never
+    re-weights the others. Terms map to sparse postings, and a query only
+    touches the documents that share a term with it. A term's postings are a
+    pair of arrays, document ids and weights, in document order.
+    """
+
+    def __init__(self):
+        # (ids, keys, scores, postings) in one attribute: compact() replaces
+        # it with a single store, so a search without the lock sees either the
+        # old index or the new one, never half of each.
+        self._index = ({}, [], [], {})
+
+    def __len__(self):
+        return len(self._index[1])
+
+    def add(self, context, response, terms, score):
+        ids, keys, scores, postings = self._index
+        key = (context, response)
+        doc_id = ids.get(key)
+        if doc_id is not None:
+            scores[doc_id] += score
+            return
+        
+        weights = {term: 1 + math.log(tf) for term, tf in Counter(terms).items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        doc_id = len(keys)
+        scores.append(score)
+        keys.append(key)
+        ids[key] = doc_id
+        for term, weight in weights.items():
+            term_postings = postings.get(term)
+            if term_postings is None:
+                term_postings = postings[term] = (array('I'), array('d'))
+            term_postings[0].append(doc_id)
+            term_postings[1].append(weight / norm)
+
+    def compact(self, max_documents):
+        _, old_keys, old_scores, old_postings = self._index
+        victims = {doc_id for doc_id, score in enumerate(old_scores) if score <= 0}
+        excess = len(old_scores) - len(victims) - max_documents
+        if excess > 0:
+            victims.update(heapq.nsmallest(excess, (
+                doc_id for doc_id, score in enumerate(old_scores) if score > 0
+            ), key=lambda doc_id: (old_scores[doc_id], doc_id)))
+        if not victims:
+            return 0
+        
+        # Survivors are renumbered in order, so the lists shrink and ties still
+        # rank the older document first.
+        doc_ids = {}
+        keys, scores = [], []
+        for doc_id, key in enumerate(old_keys):
+            if doc_id not in victims:
+                doc_ids[doc_id] = len(keys)
+                keys.append(key)
+                scores.append(old_scores[doc_id])
+        postings = {}
+        for term, (old_ids, old_weights) in old_postings.items():
+            kept = [(doc_ids[doc_id], weight) for doc_id, weight in zip(old_ids, old_weights) if doc_id in doc_ids]
+            if kept:
+                postings[term] = (array('I', [doc_id for doc_id, _ in kept]), array('d', [w for _, w in kept]))
+        ids = {key: doc_id for doc_id, key in enumerate(keys)}
+        self._index = (ids, keys, scores, postings)
+        return len(victims)
+
+    def index_knowledge(self, knowledge, extract_keywords):
+        for context, response, score in knowledge_documents(knowledge):
+            self.add(context, response, extract_keywords(context), score)
+
+    def documents(self):
+        _, keys, scores, _ = self._index
+        for (context, response), score in zip(list(keys), list(scores)):
+            yield context, response, score
+
+    def search(self, terms, k=5):
+        _, keys, scores, index = self._index
+        size = len(keys)
+        query = {}
+        for term, tf in Counter(terms).items():
+            postings = index.get(term)
+            if postings:
+                query[term] = (1 + math.log(tf)) * math.log((1 + size) / len(postings[0]))
+        norm = math.sqrt(sum(w * w for w in query.values()))
+        if not norm:
+            return []
+        
+        similarity = defaultdict(float)
+        for term, weight in query.items():
+            doc_ids, doc_weights = index[term]
+            for doc_id, doc_weight in zip(doc_ids, doc_weights):
+                similarity[doc_id] += weight * doc_weight
+        
+        ranked = heapq.nlargest(k, (
+            (value / norm * math.log1p(scores[doc_id]), -doc_id, value / norm, doc_id)
+            for doc_id, value in similarity.items() if scores[doc_id] > 0
+        ))
+        return [{'context': keys[doc_id][0], 'response': keys[doc_id][1], 'score': scores[doc_id],
+                 'similarity': value} for _, _, value, doc_id in ranked]
+
+
+def approximate_size(obj, sample=50, _seen=None):
+    """Rough deep size of obj in bytes.
+
+    Containers with more than `sample` items are extrapolated from an evenly
+    spaced sample of their items, so the cost stays bounded for large models. Attributes named
+    'store' are skipped: for the SQLite backend only the Python-side caches
+    are counted, not the database.
+    """
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, array)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        items = list(itertools.islice(obj.items(), 0, None, max(1, len(obj) // sample)))
+        measured = sum(approximate_size(k, sample, seen) + approximate_size(v, sample, seen) for k, v in items)
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        items = list(itertools.islice(obj, 0, None, max(1, len(obj) // sample)))
+        measured = sum(approximate_size(item, sample, seen) for item in items)
+    else:
+        names = getattr(obj, '__slots__', None) or list(getattr(obj, '__dict__', {}))
+        return size + sum(approximate_size(getattr(obj, name, None), sample, seen)
+                          for name in names if name != 'store')
+    return size + (measured * len(obj) // len(items) if items else 0)
+
+
+class Metrics:
+    """Rolling per-stage timings and response-path hits for one model.
+
+    Off by default. Instrumented code checks `enabled` before reading the
+    clock, so a disabled model pays one attribute lookup per stage.
+    """
+
+    STAGES = ('pattern_match', 'extract_keywords', 'knowledge_lookup', 'retrieval', 'smart_response',
+              'learn', 'persist', 'snapshot')
+    PATHS = ('pattern', 'knowledge', 'retrieval', 'smart')
+    BUCKETS_US = (10, 30, 100, 300, 1000, 3000, 10000, 30000)
+
+    def __init__(self, enabled=False, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.timings = {stage: deque(maxlen=self.window) for stage in self.STAGES}
+        self.hits = Counter()
+
+    def record(self, stage, seconds):
+        self.timings[stage].append(seconds)
+
+    def lap(self, stage, started):
+        now = time.perf_counter()
+        self.timings[stage].append(now - started)
+        return now
+
+    def hit(self, path):
+        self.hits[path] += 1
+
+    def histogram(self, samples):
+        counts = [0] * (len(self.BUCKETS_US) + 1)
+        for seconds in samples:
+            counts[bisect.bisect_left(self.BUCKETS_US, seconds * 1e6)] += 1
+        return counts
+
+    def summary(self):
+        stages = {}
+        for stage, timings in self.timings.items():
+            samples = sorted(timings)
+            if samples:
+                percentile = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] * 1e6
+                stages[stage] = {
+                    'count': len(samples),
+                    'p50_us': percentile(0.5),
+                    'p95_us': percentile(0.95),
+                    'max_us': samples[-1] * 1e6,
+                    'histogram': self.histogram(samples),
+                }
+        hits = dict(self.hits)
+        total = sum(hits.values())
+        return {
+            'stages': stages,
+            'hits': hits,
+            'hit_rates': {path: hits.get(path, 0) / total for path in self.PATHS} if total else {},
+            'buckets_us': list(self.BUCKETS_US),
+        }
+
+
+class AnalysisCache:
+    """Bounded LRU of input analyses for SelfLearningAI.generate_candidate.
+
+    Keys are the lowercased input. An entry holds the pattern the input
+    matched or, if none did, its keywords and the best knowledge entry for the
+    first three of them. learned() drops exactly the entries a learning step
+    can change: lookups over a keyword that got a record, and unmatched inputs
+    containing an alternative of a newly added pattern. Only the analysis is
+    cached, so replies are still drawn (and randomised) on every call.
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._by_keyword = defaultdict(set)
+        self._unmatched = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, key, entry, generation):
+        # Skipped if anything was learned while the entry was being computed.
+        with self._lock:
+            if generation != self.generation or key in self._entries or self.size <= 0:
+                return
+            self._entries[key] = entry
+            if entry['pattern'] is None:
+                self._unmatched.add(key)
+                for keyword in entry['lookup']:
+                    self._by_keyword[keyword].add(key)
+            while len(self._entries) > self.size:
+                self._discard(next(iter(self._entries)))
+
+    def learned(self, keywords, alternatives=()):
+        with self._lock:
+            self.generation += 1
+            stale = set()
+            for keyword in keywords:
+                stale.update(self._by_keyword.get(keyword, ()))
+            if alternatives and self._unmatched:
+                # One scan over all unmatched inputs rules out most alternatives.
+                text = '\0'.join(self._unmatched)
+                for alternative in alternatives:
+                    if alternative in text:
+                        stale.update(key for key in self._unmatched if alternative in key)
+            for key in stale:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_keyword.clear()
+            self._unmatched.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key)
+        if entry['pattern'] is None:
+            self._unmatched.discard(key)
+            for keyword in entry['lookup']:
+                keys = self._by_keyword.get(keyword)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._by_keyword[keyword]
+
+
+class MemoryBudget:
+    """Per-model limits enforced by SelfLearningAI.compact().
+
+    Knowledge entries are ranked by their score decayed with the given
+    half-life, counted from their timestamp. Learned patterns are evicted
+    oldest first, contexts lowest score first and word associations by whole
+    words, fewest successors first. Entries whose score has
+    dropped to zero or below are always removed, because they can never be
+    chosen as a response again.
+    """
+
+    def __init__(self, max_knowledge=100000, max_patterns=50000, max_contexts=100000,
+                 max_associations=200000, half_life_days=30, slack=0.1):
+        self.max_knowledge = max_knowledge
+        self.max_patterns = max_patterns
+        self.max_contexts = max_contexts
+        self.max_associations = max_associations
+        self.half_life_days = half_life_days
+        self.slack = slack
+
+    def exceeded(self, model):
+        limit = 1 + self.slack
+        return (model.knowledge_base.record_count() > self.max_knowledge * limit
+                or len(model.patterns) > self.max_patterns * limit
+                or len(model.retriever) > self.max_contexts * limit
+                or model.word_associations.count() > self.max_associations * limit)
+
+
+class SelfLearningAI:
+    STOP_WORDS = frozenset({'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 
+                            'in', 'with', 'to', 'for', 'of', 'as', 'by', 'this', 'that', 'it'})
+    WORD_RE = re.compile(r'\w+')
+
+    def __init__(self, name, knowledge_base=None, patterns=None, word_associations=None, retriever=None,
+                 budget=None):
+        self.name = name
+        self.knowledge_base = knowledge_base if knowledge_base is not None else KnowledgeIndex()
+        self.patterns = patterns if patterns is not None else PatternIndex()
+        self.context_memory = []
+        self.word_associations = word_associations if word_associations is not None else WordAssociations()
+        self.retriever = retriever if retriever is not None else ContextRetriever()
+        self.retrieval_threshold = 0.35
+        self.budget = budget or MemoryBudget()
+        self.last_compaction = None
+        self.builtin_patterns = set()
+        self.response_scores = defaultdict(int)
+        self.conversation_count = 0
+        self.lock = threading.RLock()
+        self.on_learn = None
+        self.metrics = Metrics()
+        self.cache = AnalysisCache()
+        self._initialize_basic_knowledge()
+    
+    def _initialize_basic_knowledge(self):
+        basic_patterns = [
+            ("hello|hi|hey|greetings", ["Hello! How can I help you?", "Hi there! What's on your mind?", "Hey! Nice to meet you!"]),
+            ("how are you|how do you do|what's up", ["I'm doing great! How about you?", "I'm well, thanks for asking!", "Doing fantastic! How can I assist you?"]),
+            ("bye|goodbye|see you|farewell", ["Goodbye! Have a great day!", "See you later!", "Take care!"]),
+            ("thank|thanks|appreciate", ["You're welcome!", "Happy to help!", "Anytime!"]),
+            ("your name|who are you|what are you", ["I'm a self-learning AI assistant. I learn from our conversations!", "I'm an AI that gets smarter with every chat!"]),
+            ("help|assist|support", ["I'm here to help! Just ask me anything and I'll do my best to assist you.", "Sure! What do you need help with?"]),
+            ("weather|temperature|climate", ["I don't have real-time weather data, but I can learn about weather patterns if you teach me!", "Tell me about the weather in your area!"]),
+            ("joke|funny|humor", ["Why don't scientists trust atoms? Because they make up everything! 😄", "What do you call a bear with no teeth? A gummy bear!"]),
+            ("age|old|years", ["I was just created, but I'm learning fast!", "Age is just a number. I measure my growth in conversations!"]),
+            ("love|like|enjoy", ["That's great! Tell me more about what you love!", "I'd love to hear more about that!"]),
+        ]
+        
+        for pattern, responses in basic_patterns:
+            for response in responses:
+                self.builtin_patterns.add((pattern, response))
+                self.patterns.append({
+                    'input_pattern': pattern,
+                    'response': response,
+                    'keywords': pattern.split('|')
+                })
+    
+    def extract_keywords(self, text):
+        words = self.WORD_RE.findall(text.lower())
+        keywords = [w for w in words if w not in self.STOP_WORDS and len(w) > 2]
+        return keywords if keywords else words
+    
+    def generate_response(self, user_input, context=[]):
+        return self.generate_candidate(user_input, context)['response']
+    
+    def generate_candidate(self, user_input, context=[]):
+        """Reply plus where it came from: 'pattern', 'knowledge', 'retrieval' or 'smart'."""
+        self.conversation_count += 1
+        user_input_lower = user_input.lower()
+        analysis = self.cache.get(user_input_lower)
+        if analysis is None:
+            generation = self.cache.generation
+            analysis = self.analyze(user_input_lower)
+            self.cache.put(user_input_lower, analysis, generation)
+        metrics = self.metrics if self.metrics.enabled else None
+        
+        pattern_data = analysis['pattern']
+        if pattern_data is not None:
+            if metrics:
+                metrics.hit('pattern')
+            response = random.choice([pattern_data['response']]) if isinstance(pattern_data['response'], str) else pattern_data['response']
+            return self._candidate(response, 'pattern')
+        
+        best_response = analysis['knowledge']
+        if best_response is not None:
+            if metrics:
+                metrics.hit('knowledge')
+            return self._candidate(best_response['response'], 'knowledge', best_response['score'])
+        
+        keywords = analysis['keywords']
+        started = time.perf_counter() if metrics else None
+        if keywords:
+            matches = self.retriever.search(keywords, k=3)
+            if metrics:
+                started = metrics.lap('retrieval', started)
+            if matches and matches[0]['similarity'] >= self.retrieval_threshold:
+                if metrics:
+                    metrics.hit('retrieval')
+                return self._candidate(matches[0]['response'], 'retrieval',
+                                       matches[0]['score'] * matches[0]['similarity'])
+        
+        response = self.generate_smart_response(user_input, keywords, context)
+        if metrics:
+            metrics.lap('smart_response', started)
+            metrics.hit('smart')
+        return self._candidate(response, 'smart')
+    
+    def analyze(self, user_input_lower):
+        """Matched pattern, or keywords plus the best knowledge entry for the first three."""
+        metrics = self.metrics if self.metrics.enabled else None
+        started = time.perf_counter() if metrics else None
+        analysis = {'pattern': self.patterns.match(user_input_lower), 'keywords': None, 'knowledge': None,
+                    'lookup': ()}
+        if metrics:
+            started = metrics.lap('pattern_match', started)
+        if analysis['pattern'] is not None:
+            return analysis
+        
+        keywords = self.extract_keywords(user_input_lower)
+        if metrics:
+            started = metrics.lap('extract_keywords', started)
+        analysis['keywords'] = keywords
+        analysis['lookup'] = tuple(keywords[:3])
+        for keyword in keywords[:3]: 
+            best_response = self.knowledge_base.best(keyword)
+            if best_response and best_response['score'] > 0:
+                analysis['knowledge'] = best_response
+                break
+        if metrics:
+            metrics.lap('knowledge_lookup', started)
+        return analysis
+    
+    def _candidate(self, response, source, score=0):
+        return {'model': self.name, 'response': response, 'source': source, 'score': score}
+    
+    def generate_smart_response(self, user_input, keywords, context):
+        
+        if '?' in user_input:
+            responses = [
+                f"That's an interesting question! Based on what I know, {keywords[0] if keywords else 'this topic'} is quite fascinating. What specifically would you like to know?",
+                f"Good question! I'm learning about {keywords[0] if keywords else 'this'}. Can you tell me more details?",
+                f"Let me think about that... Regarding {keywords[0] if keywords else 'your question'}, I'd say it depends on the context. What's your take on it?",
+            ]
+            return random.choice(responses)
+
+        if keywords:
+            topic = ' and '.join(keywords[:2]) if len(keywords) > 1 else keywords[0]
+            responses = [
+                f"Interesting! I'm noting down information about {topic}. This will help me learn.",
+                f"Thanks for sharing that about {topic}! I'm learning from this conversation.",
+                f"I see you're talking about {topic}. That's useful information!",
+                f"Got it! I've learned something new about {topic}. Tell me more!",
+                f"That's helpful information about {topic}! I'm storing this in my knowledge base.",
+            ]
+        else:
+            responses = [
+                "I understand. Can you elaborate on that?",
+                "Interesting! Tell me more.",
+                "I'm listening. Please continue.",
+                "That's good to know! What else?",
+            ]
+        
+        return random.choice(responses)
+    
+    def learning_steps(self, user_input, bot_response, user_feedback=None, timestamp=None):
+        keywords = [sys.intern(keyword) for keyword in self.extract_keywords(user_input)]
+        timestamp = timestamp or datetime.now().isoformat()
+        
+        score = 1
+        if user_feedback == 'positive':
+            score = 3
+        elif user_feedback == 'negative':
+            score = -1
+        
+        records = [(keyword, {
+            'response': bot_response,
+            'context': user_input,
+            'timestamp': timestamp,
+            'score': score
+        }) for keyword in keywords[:5]]
+        
+        words = user_input.lower().split()
+        links = list(zip(words, words[1:]))
+        
+        pattern = {
+            'input_pattern': '|'.join(keywords[:3]) if keywords else user_input.lower(),
+            'response': bot_response,
+            'keywords': keywords
+        }
+        document = (user_input, bot_response, keywords, score)
+        return records, links, pattern, document
+    
+    def learn_from_conversation(self, user_input, bot_response, user_feedback=None, timestamp=None):
+        metrics = self.metrics if self.metrics.enabled else None
+        started = time.perf_counter() if metrics else None
+        timestamp = timestamp or datetime.now().isoformat()
+        records, links, pattern, document = self.learning_steps(user_input, bot_response, user_feedback, timestamp)
+        
+        with self.lock:
+            for keyword, record in records:
+                self.knowledge_base.add(keyword, record)
+            for word, next_word in links:
+                self.word_associations.add(word, next_word)
+            added = self.patterns.append(pattern)
+            self.retriever.add(*document)
+            self.cache.learned([keyword for keyword, _ in records],
+                               pattern['input_pattern'].split('|') if added is not None else ())
+            if metrics:
+                started = metrics.lap('learn', started)
+            
+            if self.on_learn:
+                self.on_learn(self, user_input, bot_response, user_feedback, timestamp)
+                if metrics:
+                    metrics.lap('persist', started)
+            if self.budget.exceeded(self):
+                self.compact()
+    
+    def compact(self, now=None):
+        with self.lock:
+            budget = self.budget
+            report = {
+                'timestamp': (now or datetime.now()).isoformat(),
+                'knowledge': self.knowledge_base.compact(budget.max_knowledge, budget.half_life_days, now),
+                'patterns': self.patterns.evict_oldest(max(0, len(self.patterns) - budget.max_patterns),
+                                                       self.builtin_patterns),
+                'contexts': self.retriever.compact(budget.max_contexts),
+                'associations': self.word_associations.compact(budget.max_associations),
+            }
+            self.cache.clear()
+            self.last_compaction = report
+            return report
+    
+    def get_stats(self):
+        return {
+            'total_patterns': len(self.patterns),
+            'keywords_learned': len(self.knowledge_base),
+            'associations': self.word_associations.count(),
+            'total_knowledge': self.knowledge_base.record_count(),
+            'conversations': self.conversation_count,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+        }
+    
+    def memory_usage(self):
+        sizes = {
+            'knowledge': approximate_size(self.knowledge_base),
+            'patterns': approximate_size(self.patterns),
+            'associations': approximate_size(self.word_associations),
+            'contexts': approximate_size(self.retriever),
+        }
+        sizes['total'] = sum(sizes.values())
+        return sizes
+    
+    def to_dict(self, associations=True):
+        with self.lock:
+            data = {
+                'knowledge_base': {k: [dict(r) for r in v] for k, v in self.knowledge_base.items()},
+                'patterns': list(self.patterns),
+                'contexts': [list(document) for document in self.retriever.documents()],
+                'response_scores': dict(self.response_scores),
+                'conversation_count': self.conversation_count
+            }
+            if associations:
+                data['word_associations'] = dict(self.word_associations.items())
+            return data
+    
+    def load_dict(self, data):
+        with self.lock:
+            self.knowledge_base.update(data.get('knowledge_base', {}))
+            if 'contexts' in data:
+                for context, response, score in data['contexts']:
+                    self.retriever.add(context, response, self.extract_keywords(context), score)
+            else:
+                # Snapshots written before contexts were saved.
+                self.retriever.index_knowledge(data.get('knowledge_base', {}), self.extract_keywords)
+            self.patterns.extend(data.get('patterns', []))
+            self.word_associations.update(data.get('word_associations', {}))
+            self.response_scores = defaultdict(int, data.get('response_scores', {}))
+            self.conversation_count = data.get('conversation_count', 0)
+            self.cache.clear()
+
+
+class Ensemble:
+    """Sends each input to every model at once and keeps the best candidate.
+
+    Candidates are ranked by where they came from (learned knowledge first,
+    then retrieved contexts, patterns and the generic fallback), then by their
+    knowledge score. A model that does not answer within `timeout` seconds is
+    left out of that turn.
+    """
+
+    SOURCE_PRIORITY = {'knowledge': 3, 'retrieval': 2, 'pattern': 1, 'smart': 0}
+
+    def __init__(self, models, timeout=2.0):
+        self.models = models
+        self.timeout = timeout
+        self.order = {name: i for i, name in enumerate(models)}
+        self.pool = ThreadPoolExecutor(max_workers=len(models), thread_name_prefix='ensemble')
+
+    def rank(self, candidate):
+        return (self.SOURCE_PRIORITY[candidate['source']], candidate['score'], -self.order[candidate['model']])
+
+    def candidates(self, user_input, context=[]):
+        futures = {self.pool.submit(model.generate_candidate, user_input, context): name
+                   for name, model in self.models.items()}
+        done, late = wait(futures, timeout=self.timeout)
+        for future in late:
+            print(f"Ensemble: {futures[future]} timed out")
+        candidates = []
+        for future in done:
+            try:
+                candidates.append(future.result())
+            except Exception as e:
+                print(f"Error in {futures[future]}: {e}")
+        return sorted(candidates, key=self.rank, reverse=True)
+
+    def learn_from_conversation(self, candidates, user_input, bot_response, user_feedback=None):
+        for candidate in candidates:
+            self.models[candidate['model']].learn_from_conversation(user_input, bot_response, user_feedback)
+
+    def close(self):
+        self.pool.shutdown(wait=False)
+
+
+def record_snapshot(models, seconds):
+    # One snapshot covers every model, so each enabled model sees its duration.
+    for model in models.values():
+        if model.metrics.enabled:
+            model.metrics.record('snapshot', seconds)
+
+
+class KnowledgeJournal:
+    """Knowledge snapshot plus an append-only journal of learning steps.
+
+    Every learn_from_conversation call on an attached model is appended to the
+    journal as one compact JSON line. A background thread periodically writes a
+    new snapshot through a temp file and an atomic rename, then drops the
+    journal lines it covers. Word associations are not in the JSON snapshot but
+    in a binary sidecar next to it (ai_knowledge.assoc), written just before
+    it. Loading reads both and replays the journal lines recorded after them.
+
+    With load(models, lazy=True) the files are parsed but no model is built;
+    materialize(name) builds one model when it is first needed. Until then a
+    snapshot writes that model's parsed data back unchanged.
+    """
+
+    def __init__(self, path='ai_knowledge.json', interval=60):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.associations_path = os.path.splitext(path)[0] + '.assoc'
+        self.interval = interval
+        self.models = {}
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._pending = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def create_model(self, name):
+        return SelfLearningAI(name)
+    
+    def load(self, models, lazy=False):
+        self.read(models, lazy)
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+        for model in self.models.values():
+            model.on_learn = self.record
+    
+    def read(self, models, lazy=False):
+        self.models = models
+        self._pending = {name: {'data': None, 'associations': None, 'journal': []} for name in models}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                
+                self.snapshot_seq = data.get('_journal_seq', 0)
+                for model_name, model_data in data.items():
+                    if model_name in self._pending:
+                        self._pending[model_name]['data'] = model_data
+            except Exception as e:
+                print(f"Error loading knowledge: {e}")
+        
+        if os.path.exists(self.associations_path):
+            try:
+                for model_name, blob in self._read_associations():
+                    if model_name in self._pending:
+                        self._pending[model_name]['associations'] = blob
+            except Exception as e:
+                print(f"Error loading word associations: {e}")
+        missing = [name for name, pending in self._pending.items()
+                   if pending['data'] is not None and 'word_associations' not in pending['data']
+                   and pending['associations'] is None]
+        if missing:
+            print(f"Warning: no word associations for {', '.join(missing)} in {self.associations_path}; "
+                  f"keep it next to {self.path}, or they start empty")
+        
+        self.seq = self.snapshot_seq
+        for path in (self.journal_path + '.old', self.journal_path):
+            self._replay(path)
+        if not lazy:
+            for model_name in list(self._pending):
+                self.materialize(model_name)
+    
+    def _replay(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    print(f"Skipping damaged journal line in {path}")
+                    continue
+                
+                if entry['s'] <= self.snapshot_seq or entry['m'] not in self._pending:
+                    continue
+                self._pending[entry['m']]['journal'].append(entry)
+                self.seq = max(self.seq, entry['s'])
+    
+    def materialize(self, model_name):
+        with self._snapshot_lock:
+            pending = self._pending.pop(model_name, None)
+            if pending is None:
+                return
+            model = self.models[model_name]
+            with model.lock:
+                on_learn, model.on_learn = model.on_learn, None
+                try:
+                    if pending['data']:
+                        model.load_dict(pending['data'])
+                    if pending['associations']:
+                        model.word_associations.load_bytes(pending['associations'])
+                    for entry in pending['journal']:
+                        model.learn_from_conversation(entry['u'], entry['r'], entry.get('f'), entry['t'])
+                        model.conversation_count = max(model.conversation_count, entry.get('c', 0))
+                finally:
+                    model.on_learn = on_learn
+    
+    def record(self, model, user_input, bot_response, user_feedback, timestamp):
+        with self._lock:
+            self.seq += 1
+            entry = {'s': self.seq, 'm': model.name, 'u': user_input, 'r': bot_response,
+                     't': timestamp, 'c': model.conversation_count}
+            if user_feedback:
+                entry['f'] = user_feedback
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._file.flush()
+    
+    def snapshot(self):
+        started = time.perf_counter()
+        # Journal lines of an unbuilt model are about to be rotated away.
+        for model_name in [name for name, pending in list(self._pending.items()) if pending['journal']]:
+            self.materialize(model_name)
+        with self._snapshot_lock:
+            models = [model for name, model in self.models.items() if name not in self._pending]
+            for model in models:
+                model.lock.acquire()
+            try:
+                for model in models:
+                    model.compact()
+                data, associations = {}, []
+                for model_name, model in self.models.items():
+                    pending = self._pending.get(model_name)
+                    if pending is None:
+                        data[model_name] = model.to_dict(associations=False)
+                        associations.append((model_name, model.word_associations.to_bytes()))
+                        continue
+                    if pending['data']:
+                        data[model_name] = pending['data']
+                    if pending['associations']:
+                        associations.append((model_name, pending['associations']))
+                with self._lock:
+                    data['_journal_seq'] = self.seq
+                    self._rotate()
+            finally:
+                for model in models:
+                    model.lock.release()
+            
+            self._write_associations(associations)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            os.remove(self.journal_path + '.old')
+            self.snapshot_seq = data['_journal_seq']
+        record_snapshot(self.models, time.perf_counter() - started)
+    
+    def _write_associations(self, associations):
+        # Written before the JSON snapshot: if we crash in between, replaying
+        # the journal on top only re-adds edges that are already there.
+        tmp_path = self.associations_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for model_name, blob in associations:
+                name = model_name.encode('utf-8')
+                f.write(struct.pack('<HQ', len(name), len(blob)))
+                f.write(name)
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.associations_path)
+    
+    def _read_associations(self):
+        with open(self.associations_path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset < len(data):
+            name_length, blob_length = struct.unpack_from('<HQ', data, offset)
+            offset += struct.calcsize('<HQ')
+            model_name = data[offset:offset + name_length].decode('utf-8')
+            offset += name_length
+            yield model_name, data[offset:offset + blob_length]
+            offset += blob_length
+    
+    def _rotate(self):
+        old_path = self.journal_path + '.old'
+        self._file.close()
+        if os.path.exists(old_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as src, open(old_path, 'a', encoding='utf-8') as dst:
+                dst.write(src.read())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, old_path)
+        self._file = open(self.journal_path, 'a', encoding='utf-8')
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='knowledge-snapshot', daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.seq > self.snapshot_seq:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    print(f"Error saving knowledge: {e}")
+    
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        try:
+            if self.seq > self.snapshot_seq:
+                self.snapshot()
+        finally:
+            for model in self.models.values():
+                model.on_learn = None
+            self._file.close()
+
+
+class SQLiteKnowledgeStore:
+    """Knowledge for every model in one indexed SQLite file.
+
+    Models made by create_model keep their knowledge, patterns and word
+    associations in the database and fetch rows per keyword as they are needed,
+    so startup no longer reads the whole learned history. Each learning step is
+    committed on its own. A new database is filled from the JSON snapshot and
+    journal the first time it is opened.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS models (
+            name TEXT PRIMARY KEY,
+            conversation_count INTEGER NOT NULL DEFAULT 0,
+            response_scores TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS knowledge (
+            model TEXT NOT NULL,
+            keyword TEXT NOT NULL,
+            response TEXT NOT NULL,
+            context TEXT,
+            timestamp TEXT,
+            score INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (model, keyword, response)
+        );
+        CREATE INDEX IF NOT EXISTS knowledge_best ON knowledge (model, keyword, score DESC);
+        CREATE TABLE IF NOT EXISTS patterns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model TEXT NOT NULL,
+            input_pattern TEXT NOT NULL,
+            response TEXT NOT NULL,
+            keywords TEXT NOT NULL,
+            UNIQUE (model, input_pattern, response)
+        );
+        CREATE TABLE IF NOT EXISTS pattern_alternatives (
+            model TEXT NOT NULL,
+            alternative TEXT NOT NULL,
+            pattern_id INTEGER NOT NULL,
+            PRIMARY KEY (model, alternative, pattern_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS pattern_lengths (
+            model TEXT NOT NULL,
+            length INTEGER NOT NULL,
+            PRIMARY KEY (model, length)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS associations (
+            model TEXT NOT NULL,
+            word TEXT NOT NULL,
+            next_word TEXT NOT NULL,
+            PRIMARY KEY (model, word, next_word)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS association_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model TEXT NOT NULL,
+            token TEXT NOT NULL,
+            UNIQUE (model, token)
+        );
+        CREATE TABLE IF NOT EXISTS contexts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model TEXT NOT NULL,
+            context TEXT NOT NULL,
+            response TEXT NOT NULL,
+            score INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (model, context, response)
+        );
+        CREATE TABLE IF NOT EXISTS context_terms (
+            model TEXT NOT NULL,
+            term TEXT NOT NULL,
+            context_id INTEGER NOT NULL,
+            weight REAL NOT NULL,
+            PRIMARY KEY (model, term, context_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS context_terms_context ON context_terms (context_id);
+    """
+
+    def __init__(self, path='ai_knowledge.db', json_path=None, cache_size=1024):
+        self.path = path
+        self.json_path = json_path or os.path.splitext(path)[0] + '.json'
+        self.cache_size = cache_size
+        self.models = {}
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.create_function('log1p', 1, math.log1p, deterministic=True)
+        self.conn.create_function('decayed_score', 3, decayed_score)
+        has_tokens = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'association_tokens'").fetchone()
+        self.conn.executescript(self.SCHEMA)
+        if not has_tokens:
+            # Databases from before token order was kept: their order is lost,
+            # so existing tokens count as oldest, alphabetically.
+            self.conn.execute(
+                'INSERT OR IGNORE INTO association_tokens (model, token) '
+                'SELECT model, word FROM associations UNION SELECT model, next_word FROM associations '
+                'ORDER BY 1, 2')
+            self.conn.commit()
+        self.is_new = not self.query('SELECT 1 FROM models LIMIT 1')
+    
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+    
+    def execute(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params)
+    
+    def commit(self):
+        with self.lock:
+            self.conn.commit()
+    
+    def create_model(self, name):
+        self.execute('INSERT OR IGNORE INTO models (name) VALUES (?)', (name,))
+        model = SelfLearningAI(name,
+                               knowledge_base=SQLiteKnowledgeIndex(self, name),
+                               patterns=SQLitePatternIndex(self, name),
+                               word_associations=SQLiteWordAssociations(self, name),
+                               retriever=SQLiteContextRetriever(self, name))
+        self.commit()
+        return model
+    
+    def load(self, models, lazy=False):
+        # Models read from the database on demand, so there is nothing to defer.
+        self.models = models
+        if self.is_new and os.path.exists(self.json_path):
+            self.migrate_json(self.json_path)
+        
+        for name, count, scores in self.query('SELECT name, conversation_count, response_scores FROM models'):
+            if name in self.models:
+                self.models[name].conversation_count = count
+                self.models[name].response_scores = defaultdict(int, json.loads(scores))
+        for model in self.models.values():
+            model.on_learn = self._learned
+    
+    def migrate_json(self, json_path):
+        KnowledgeJournal(json_path).read(self.models)
+        self.snapshot()
+        self.is_new = False
+    
+    def materialize(self, model_name):
+        pass
+    
+    def _learned(self, model, user_input, bot_response, user_feedback, timestamp):
+        self.commit()
+    
+    def start(self):
+        pass
+    
+    def snapshot(self):
+        started = time.perf_counter()
+        # Learning takes model.lock before self.lock, so take them in that
+        # order here too: compact and read each model before the store lock.
+        rows = []
+        for name, model in self.models.items():
+            with model.lock:
+                model.compact()
+                rows.append((model.conversation_count, json.dumps(dict(model.response_scores)), name))
+        with self.lock:
+            self.conn.executemany(
+                'UPDATE models SET conversation_count = ?, response_scores = ? WHERE name = ?', rows)
+            self.conn.commit()
+        record_snapshot(self.models, time.perf_counter() - started)
+    
+    def close(self):
+        try:
+            self.snapshot()
+        finally:
+            for model in self.models.values():
+                model.on_learn = None
+            self.conn.close()
+
+
+class SQLiteKnowledgeIndex:
+    """KnowledgeIndex backed by the knowledge table, with an LRU of best responses."""
+
+    def __init__(self, store, model):
+        self.store = store
+        self.model = model
+        self._best = OrderedDict()
+        self._keywords = None
+        self._records = None
+
+    def __contains__(self, keyword):
+        return bool(self.store.query(
+            'SELECT 1 FROM knowledge WHERE model = ? AND keyword = ? LIMIT 1', (self.model, keyword)))
+
+    def __len__(self):
+        if self._keywords is None:
+            self._keywords, self._records = self.store.query(
+                'SELECT COUNT(DISTINCT keyword), COUNT(*) FROM knowledge WHERE model = ?', (self.model,))[0]
+        return self._keywords
+
+    def __iter__(self):
+        rows = self.store.query('SELECT DISTINCT keyword FROM knowledge WHERE model = ?', (self.model,))
+        return iter([row[0] for row in rows])
+
+    def record_count(self):
+        len(self)
+        return self._records
+
+    def get(self, keyword):
+        rows = self.store.query(
+            'SELECT response, context, timestamp, score, count FROM knowledge '
+            'WHERE model = ? AND keyword = ? ORDER BY rowid', (self.model, keyword))
+        return [self._record(row) for row in rows]
+
+    def items(self):
+        rows = self.store.query(
+            'SELECT keyword, response, context, timestamp, score, count FROM knowledge '
+            'WHERE model = ? ORDER BY keyword, rowid', (self.model,))
+        keyword, records = None, []
+        for row in rows:
+            if row[0] != keyword and records:
+                yield keyword, records
+                records = []
+            keyword = row[0]
+            records.append(self._record(row[1:]))
+        if records:
+            yield keyword, records
+
+    def values(self):
+        for _, records in self.items():
+            yield records
+
+    def update(self, knowledge):
+        for keyword, records in knowledge.items():
+            for record in records:
+                self.add(keyword, record)
+
+    def add(self, keyword, record):
+        with self.store.lock:
+            if self._keywords is not None:
+                if keyword not in self:
+                    self._keywords += 1
+                if not self.store.query(
+                        'SELECT 1 FROM knowledge WHERE model = ? AND keyword = ? AND response = ?',
+                        (self.model, keyword, record['response'])):
+                    self._records += 1
+            self.store.execute(
+                'INSERT INTO knowledge (model, keyword, response, context, timestamp, score, count) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (model, keyword, response) DO UPDATE SET '
+                'score = score + excluded.score, count = count + excluded.count, '
+                'context = CASE WHEN excluded.timestamp >= timestamp THEN excluded.context ELSE context END, '
+                'timestamp = MAX(timestamp, excluded.timestamp)',
+                (self.model, keyword, record['response'], record.get('context'), record.get('timestamp', ''),
+                 record.get('score', 0), record.get('count', 1)))
+            self._best.pop(keyword, None)
+
+    def best(self, keyword):
+        with self.store.lock:
+            if keyword in self._best:
+                self._best.move_to_end(keyword)
+                return self._best[keyword]
+            rows = self.store.query(
+                'SELECT response, context, timestamp, score, count FROM knowledge '
+                'WHERE model = ? AND keyword = ? ORDER BY score DESC, rowid LIMIT 1', (self.model, keyword))
+            record = self._record(rows[0]) if rows else None
+            self._best[keyword] = record
+            if len(self._best) > self.store.cache_size:
+                self._best.popitem(last=False)
+            return record
+
+    def compact(self, max_records, half_life_days, now=None):
+        with self.store.lock:
+            removed = self.store.execute(
+                'DELETE FROM knowledge WHERE model = ? AND score <= 0', (self.model,)).rowcount
+            excess = self.store.query('SELECT COUNT(*) FROM knowledge WHERE model = ?', (self.model,))[0][0] - max_records
+            if excess > 0:
+                removed += self.store.execute(
+                    'DELETE FROM knowledge WHERE rowid IN (SELECT rowid FROM knowledge WHERE model = ? '
+                    'ORDER BY decayed_score(score, timestamp, ?), rowid LIMIT ?)',
+                    (self.model, half_life_days, excess)).rowcount
+            self.store.commit()
+            self._best.clear()
+            self._keywords = self._records = None
+            return removed
+
+    def _record(self, row):
+        response, context, timestamp, score, count = row
+        return {'response': response, 'context': context, 'timestamp': timestamp, 'score': score, 'count': count}
+
+
+class SQLitePatternIndex:
+    """PatternIndex backed by the patterns and pattern_alternatives tables.
+
+    Only the set of alternative lengths is kept in memory. A lookup sends every
+    input slice of those lengths to the alternative index in one query and
+    takes the lowest pattern id, which is the earliest pattern that matches.
+    Identical (input_pattern, response) pairs are stored once.
+    """
+
+    MAX_VARIABLES = 900
+
+    def __init__(self, store, model):
+        self.store = store
+        self.model = model
+        self._lengths = None
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self.store.query('SELECT COUNT(*) FROM patterns WHERE model = ?', (self.model,))[0][0]
+        return self._count
+
+    def __iter__(self):
+        rows = self.store.query(
+            'SELECT input_pattern, response, keywords FROM patterns WHERE model = ? ORDER BY id', (self.model,))
+        return iter([self._pattern(row) for row in rows])
+
+    def append(self, pattern_data):
+        with self.store.lock:
+            cursor = self.store.execute(
+                'INSERT OR IGNORE INTO patterns (model, input_pattern, response, keywords) VALUES (?, ?, ?, ?)',
+                (self.model, pattern_data['input_pattern'], pattern_data['response'],
+                 json.dumps(pattern_data.get('keywords', []))))
+            if not cursor.rowcount:
+                return None
+            pattern_id = cursor.lastrowid
+            for part in set(pattern_data['input_pattern'].split('|')):
+                self.store.execute(
+                    'INSERT OR IGNORE INTO pattern_alternatives (model, alternative, pattern_id) VALUES (?, ?, ?)',
+                    (self.model, part, pattern_id))
+                self.store.execute(
+                    'INSERT OR IGNORE INTO pattern_lengths (model, length) VALUES (?, ?)', (self.model, len(part)))
+                if self._lengths is not None:
+                    self._lengths.add(len(part))
+            if self._count is not None:
+                self._count += 1
+            return pattern_id
+
+    def extend(self, patterns):
+        for pattern_data in patterns:
+            self.append(pattern_data)
+
+    def evict_oldest(self, count, keep=()):
+        if count <= 0:
+            return 0
+        with self.store.lock:
+            rows = self.store.query(
+                'SELECT id, input_pattern, response FROM patterns WHERE model = ? ORDER BY id LIMIT ?',
+                (self.model, count + len(keep)))
+            victims = [row for row in rows if (row[1], row[2]) not in keep][:count]
+            for pattern_id, input_pattern, _ in victims:
+                for part in set(input_pattern.split('|')):
+                    self.store.execute(
+                        'DELETE FROM pattern_alternatives WHERE model = ? AND alternative = ? AND pattern_id = ?',
+                        (self.model, part, pattern_id))
+                self.store.execute('DELETE FROM patterns WHERE id = ?', (pattern_id,))
+            self.store.commit()
+            self._count = None
+            return len(victims)
+
+    def match(self, text):
+        if self._lengths is None:
+            rows = self.store.query('SELECT length FROM pattern_lengths WHERE model = ?', (self.model,))
+            self._lengths = {row[0] for row in rows}
+        size = len(text)
+        candidates = set()
+        for length in tuple(self._lengths):
+            if length <= size:
+                candidates.update(text[i:i + length] for i in range(size - length + 1))
+        
+        candidates = list(candidates)
+        best = None
+        for start in range(0, len(candidates), self.MAX_VARIABLES):
+            chunk = candidates[start:start + self.MAX_VARIABLES]
+            row = self.store.query(
+                'SELECT MIN(pattern_id) FROM pattern_alternatives WHERE model = ? AND alternative IN (%s)'
+                % ','.join('?' * len(chunk)), (self.model, *chunk))[0]
+            if row[0] is not None and (best is None or row[0] < best):
+                best = row[0]
+        if best is None:
+            return None
+        rows = self.store.query('SELECT input_pattern, response, keywords FROM patterns WHERE id = ?', (best,))
+        return self._pattern(rows[0])
+
+    def _pattern(self, row):
+        input_pattern, response, keywords = row
+        return {'input_pattern': input_pattern, 'response': response, 'keywords': json.loads(keywords)}
+
+
+class SQLiteContextRetriever:
+    """ContextRetriever backed by the contexts and context_terms tables.
+
+    Same weighting as ContextRetriever; the sparse product and the ranking run
+    as one grouped query over the term index.
+    """
+
+    def __init__(self, store, model):
+        self.store = store
+        self.model = model
+        self._count = None
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self.store.query('SELECT COUNT(*) FROM contexts WHERE model = ?', (self.model,))[0][0]
+        return self._count
+
+    def add(self, context, response, terms, score):
+        with self.store.lock:
+            cursor = self.store.execute(
+                'INSERT OR IGNORE INTO contexts (model, context, response, score) VALUES (?, ?, ?, ?)',
+                (self.model, context, response, score))
+            if not cursor.rowcount:
+                self.store.execute(
+                    'UPDATE contexts SET score = score + ? WHERE model = ? AND context = ? AND response = ?',
+                    (score, self.model, context, response))
+                return
+            
+            context_id = cursor.lastrowid
+            weights = {term: 1 + math.log(tf) for term, tf in Counter(terms).items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                self.store.execute(
+                    'INSERT INTO context_terms (model, term, context_id, weight) VALUES (?, ?, ?, ?)',
+                    (self.model, term, context_id, weight / norm))
+            if self._count is not None:
+                self._count += 1
+
+    def index_knowledge(self, knowledge, extract_keywords):
+        for context, response, score in knowledge_documents(knowledge):
+            self.add(context, response, extract_keywords(context), score)
+
+    def documents(self):
+        yield from self.store.query(
+            'SELECT context, response, score FROM contexts WHERE model = ? ORDER BY id', (self.model,))
+
+    def compact(self, max_documents):
+        with self.store.lock:
+            victims = [row[0] for row in self.store.query(
+                'SELECT id FROM contexts WHERE model = ? AND score <= 0', (self.model,))]
+            excess = len(self) - len(victims) - max_documents
+            if excess > 0:
+                victims += [row[0] for row in self.store.query(
+                    'SELECT id FROM contexts WHERE model = ? AND score > 0 ORDER BY score, id LIMIT ?',
+                    (self.model, excess))]
+            for context_id in victims:
+                self.store.execute('DELETE FROM context_terms WHERE context_id = ?', (context_id,))
+                self.store.execute('DELETE FROM contexts WHERE id = ?', (context_id,))
+            self.store.commit()
+            self._count = None
+            return len(victims)
+
+    def search(self, terms, k=5):
+        size = len(self)
+        query = {}
+        for term, tf in Counter(terms).items():
+            df = self.store.query(
+                'SELECT COUNT(*) FROM context_terms WHERE model = ? AND term = ?', (self.model, term))[0][0]
+            if df:
+                query[term] = (1 + math.log(tf)) * math.log((1 + size) / df)
+        norm = math.sqrt(sum(w * w for w in query.values()))
+        if not norm:
+            return []
+        
+        values = ', '.join('(?, ?)' for _ in query)
+        params = [value for term, weight in query.items() for value in (term, weight / norm)]
+        rows = self.store.query(
+            f'WITH q (term, weight) AS (VALUES {values}) '
+            'SELECT c.context, c.response, c.score, SUM(t.weight * q.weight) AS similarity '
+            'FROM q JOIN context_terms t ON t.model = ? AND t.term = q.term '
+            'JOIN contexts c ON c.id = t.context_id '
+            'WHERE c.score > 0 GROUP BY c.id '
+            'ORDER BY similarity * log1p(c.score) DESC, c.id LIMIT ?',
+            (*params, self.model, k))
+        return [{'context': context, 'response': response, 'score': score, 'similarity': similarity}
+                for context, response, score, similarity in rows]
+
+
+class SQLiteWordAssociations:
+    def __init__(self, store, model):
+        self.store = store
+        self.model = model
+        self._words = None
+        self._count = None
+
+    def __contains__(self, word):
+        return bool(self.store.query(
+            'SELECT 1 FROM associations WHERE model = ? AND word = ? LIMIT 1', (self.model, word)))
+
+    def __len__(self):
+        self._load_counts()
+        return self._words
+
+    def _load_counts(self):
+        if self._words is None:
+            self._words, self._count = self.store.query(
+                'SELECT COUNT(DISTINCT word), COUNT(*) FROM associations WHERE model = ?', (self.model,))[0]
+
+    def get(self, word):
+        rows = self.store.query(
+            'SELECT next_word FROM associations WHERE model = ? AND word = ?', (self.model, word))
+        return {row[0] for row in rows}
+
+    def add(self, word, next_word):
+        with self.store.lock:
+            new_word = self._words is not None and word not in self
+            cursor = self.store.execute(
+                'INSERT OR IGNORE INTO associations (model, word, next_word) VALUES (?, ?, ?)',
+                (self.model, word, next_word))
+            if cursor.rowcount:
+                # First-seen order of tokens, like the ids of Vocabulary.
+                for token in (word, next_word):
+                    self.store.execute(
+                        'INSERT OR IGNORE INTO association_tokens (model, token) VALUES (?, ?)', (self.model, token))
+            if self._words is not None:
+                self._words += new_word
+                self._count += cursor.rowcount
+
+    def update(self, associations):
+        for word, next_words in associations.items():
+            for next_word in next_words:
+                self.add(word, next_word)
+
+    def items(self):
+        rows = self.store.query(
+            'SELECT word, next_word FROM associations WHERE model = ? ORDER BY word', (self.model,))
+        word, next_words = None, []
+        for row in rows:
+            if row[0] != word and next_words:
+                yield word, next_words
+                next_words = []
+            word = row[0]
+            next_words.append(row[1])
+        if next_words:
+            yield word, next_words
+
+    def count(self):
+        self._load_counts()
+        return self._count
+
+    def compact(self, max_associations):
+        # Same order as WordAssociations.compact: fewest successors, then the
+        # word whose token was seen first.
+        with self.store.lock:
+            excess = self.count() - max_associations
+            if excess <= 0:
+                return 0
+            removed = 0
+            for word, edges in self.store.query(
+                    'SELECT a.word, COUNT(*) AS edges FROM associations a '
+                    'JOIN association_tokens t ON t.model = a.model AND t.token = a.word '
+                    'WHERE a.model = ? GROUP BY a.word ORDER BY edges, t.id', (self.model,)):
+                if removed >= excess:
+                    break
+                self.store.execute('DELETE FROM associations WHERE model = ? AND word = ?', (self.model, word))
+                removed += edges
+            self.store.execute(
+                'DELETE FROM association_tokens WHERE model = ? '
+                'AND token NOT IN (SELECT word FROM associations WHERE model = ?) '
+                'AND token NOT IN (SELECT next_word FROM associations WHERE model = ?)',
+                (self.model, self.model, self.model))
+            self.store.commit()
+            self._words = self._count = None
+            return removed
+
+    def load_bytes(self, data):
+        self.update(dict(WordAssociations.from_bytes(data).items()))
+
+
+def create_storage(backend='json', path=None):
+    if backend == 'sqlite':
+        return SQLiteKnowledgeStore(path or 'ai_knowledge.db')
+    return KnowledgeJournal(path or 'ai_knowledge.json')
+
+
+class Transcript:
+    """Append-only JSONL transcript of one chat, one message per line.
+
+    Lines are {"role", "content", "timestamp"} messages, the format train.py
+    reads. A reply also carries "reply_to", the line number of the message it
+    answers, since several messages can be sent before the first reply. The
+    file is created on the first message, and the offset of every line is kept
+    so older messages can be read back a page at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('Q')
+        self._file = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, role, content, timestamp=None, reply_to=None):
+        if self._file is None:
+            self._file = open(self.path, 'a+b')
+        message = {'role': role, 'content': content, 'timestamp': timestamp or datetime.now().isoformat()}
+        if reply_to is not None:
+            message['reply_to'] = reply_to
+        self._file.seek(0, os.SEEK_END)
+        self.offsets.append(self._file.tell())
+        self._file.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+        self._file.flush()
+        return len(self.offsets) - 1
+
+    def read(self, start, stop):
+        if self._file is None or start >= stop:
+            return []
+        self._file.seek(self.offsets[start])
+        return [json.loads(self._file.readline()) for _ in range(start, stop)]
+
+    def sync(self):
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
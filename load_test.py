@@ -0,0 +1,126 @@
+"""Load generator for chat_server.py.
+
+    python load_test.py [--url http://127.0.0.1:8765] [--sessions 1 4 16 64] [--requests 50]
+
+Each simulated session sends a seeded stream of messages over its own
+keep-alive connection and rates some of the replies. Without --url an
+in-process server is started on a throwaway copy of the knowledge.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+MESSAGES = [
+    "hello there", "how are you today", "tell me a joke", "what is the weather like",
+    "I love playing chess", "can you help me with python", "who are you", "thanks a lot",
+    "my cat likes to sleep all day", "what should I cook for dinner", "goodbye for now",
+    "do you know anything about rockets", "I enjoy hiking in the mountains",
+]
+
+
+def run_session(host, port, session_number, requests, latencies, errors):
+    rng = random.Random(session_number)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    session_id = None
+    try:
+        for _ in range(requests):
+            body = {'message': rng.choice(MESSAGES), 'session': session_id}
+            started = time.perf_counter()
+            conn.request('POST', '/chat', json.dumps(body), {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            data = json.loads(response.read())
+            latencies.append(time.perf_counter() - started)
+            if response.status != 200:
+                errors.append(data.get('error'))
+                continue
+            session_id = data['session']
+
+            if rng.random() < 0.2:
+                feedback = {'session': session_id, 'feedback': rng.choice(['positive', 'negative'])}
+                conn.request('POST', '/feedback', json.dumps(feedback), {'Content-Type': 'application/json'})
+                conn.getresponse().read()
+    except Exception as e:
+        errors.append(str(e))
+    finally:
+        conn.close()
+
+
+def run_level(host, port, sessions, requests):
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=run_session, args=(host, port, i, requests, latencies, errors))
+        for i in range(sessions)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+    return {
+        'sessions': sessions,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(0.5),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def start_local_server():
+    from chat_server import ChatService, create_server
+    from engine import KnowledgeJournal
+
+    workdir = tempfile.mkdtemp(prefix='catbot-load-')
+    path = os.path.join(workdir, 'ai_knowledge.json')
+    if os.path.exists('ai_knowledge.json'):
+        shutil.copy('ai_knowledge.json', path)
+    service = ChatService(KnowledgeJournal(path))
+    server = create_server(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        service.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return server.server_address[0], server.server_address[1], stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for chat_server.py")
+    parser.add_argument('--url', help="server to test (default: start one in-process)")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--requests', type=int, default=50, help="messages per session")
+    args = parser.parse_args()
+
+    stop = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port, stop = start_local_server()
+
+    print(f"{'sessions':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    try:
+        for sessions in args.sessions:
+            result = run_level(host, port, sessions, args.requests)
+            print(f"{result['sessions']:>8} {result['requests']:>9} {result['errors']:>7} "
+                  f"{result['rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+    finally:
+        if stop:
+            stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,164 +1,75 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import json
-import os
+import argparse
+import queue
+import math
+import threading
 from datetime import datetime
-import random
-import re
-from collections import defaultdict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import MODEL_NAMES, ENSEMBLE_NAME, Ensemble, Transcript, create_storage
+
+IMPORT_SECONDS = time.perf_counter() - STARTED
 
-class SelfLearningAI:
-    def __init__(self, name):
-        self.name = name
-        self.knowledge_base = defaultdict(list)
-        self.patterns = []
-        self.context_memory = []
-        self.word_associations = defaultdict(set)
-        self.response_scores = defaultdict(int)
-        self.conversation_count = 0
-        self._initialize_basic_knowledge()
-    
-    def _initialize_basic_knowledge(self):
-        basic_patterns = [
-            ("hello|hi|hey|greetings", ["Hello! How can I help you?", "Hi there! What's on your mind?", "Hey! Nice to meet you!"]),
-            ("how are you|how do you do|what's up", ["I'm doing great! How about you?", "I'm well, thanks for asking!", "Doing fantastic! How can I assist you?"]),
-            ("bye|goodbye|see you|farewell", ["Goodbye! Have a great day!", "See you later!", "Take care!"]),
-            ("thank|thanks|appreciate", ["You're welcome!", "Happy to help!", "Anytime!"]),
-            ("your name|who are you|what are you", ["I'm a self-learning AI assistant. I learn from our conversations!", "I'm an AI that gets smarter with every chat!"]),
-            ("help|assist|support", ["I'm here to help! Just ask me anything and I'll do my best to assist you.", "Sure! What do you need help with?"]),
-            ("weather|temperature|climate", ["I don't have real-time weather data, but I can learn about weather patterns if you teach me!", "Tell me about the weather in your area!"]),
-            ("joke|funny|humor", ["Why don't scientists trust atoms? Because they make up everything! 😄", "What do you call a bear with no teeth? A gummy bear!"]),
-            ("age|old|years", ["I was just created, but I'm learning fast!", "Age is just a number. I measure my growth in conversations!"]),
-            ("love|like|enjoy", ["That's great! Tell me more about what you love!", "I'd love to hear more about that!"]),
-        ]
-        
-        for pattern, responses in basic_patterns:
-            for response in responses:
-                self.patterns.append({
-                    'input_pattern': pattern,
-                    'response': response,
-                    'keywords': pattern.split('|')
-                })
-    def extract_keywords(self, text):
-        stop_words = {'the', 'is', 'at', 'which', 'on', 'a', 'an', 'and', 'or', 'but', 
-                     'in', 'with', 'to', 'for', 'of', 'as', 'by', 'this', 'that', 'it'}
-        words = re.findall(r'\w+', text.lower())
-        keywords = [w for w in words if w not in stop_words and len(w) > 2]
-        return keywords if keywords else words
-    
-    def generate_response(self, user_input, context=[]):
-        self.conversation_count += 1
-        user_input_lower = user_input.lower()
-        
-        for pattern_data in self.patterns:
-            pattern = pattern_data['input_pattern']
-            pattern_parts = pattern.split('|')
-            
-            if any(part in user_input_lower for part in pattern_parts):
-                return random.choice([pattern_data['response']]) if isinstance(pattern_data['response'], str) else pattern_data['response']
-        
-        keywords = self.extract_keywords(user_input)
-        
-        if keywords:
-            for keyword in keywords[:3]: 
-                if keyword in self.knowledge_base and self.knowledge_base[keyword]:
-                    responses = self.knowledge_base[keyword]
-                    best_response = max(responses, key=lambda x: x.get('score', 0))
-                    if best_response['score'] > 0:
-                        return best_response['response']
-        
-        return self.generate_smart_response(user_input, keywords, context)
-    
-    def generate_smart_response(self, user_input, keywords, context):
-        
-        if '?' in user_input:
-            responses = [
-                f"That's an interesting question! Based on what I know, {keywords[0] if keywords else 'this topic'} is quite fascinating. What specifically would you like to know?",
-                f"Good question! I'm learning about {keywords[0] if keywords else 'this'}. Can you tell me more details?",
-                f"Let me think about that... Regarding {keywords[0] if keywords else 'your question'}, I'd say it depends on the context. What's your take on it?",
-            ]
-            return random.choice(responses)
 
-        if keywords:
-            topic = ' and '.join(keywords[:2]) if len(keywords) > 1 else keywords[0]
-            responses = [
-                f"Interesting! I'm noting down information about {topic}. This will help me learn.",
-                f"Thanks for sharing that about {topic}! I'm learning from this conversation.",
-                f"I see you're talking about {topic}. That's useful information!",
-                f"Got it! I've learned something new about {topic}. Tell me more!",
-                f"That's helpful information about {topic}! I'm storing this in my knowledge base.",
-            ]
-        else:
-            responses = [
-                "I understand. Can you elaborate on that?",
-                "Interesting! Tell me more.",
-                "I'm listening. Please continue.",
-                "That's good to know! What else?",
-            ]
-        
-        return random.choice(responses)
-    
-    def learn_from_conversation(self, user_input, bot_response, user_feedback=None):
-        keywords = self.extract_keywords(user_input)
-        
-        score = 1
-        if user_feedback == 'positive':
-            score = 3
-        elif user_feedback == 'negative':
-            score = -1
-        
-        for keyword in keywords[:5]:  
-            self.knowledge_base[keyword].append({
-                'response': bot_response,
-                'context': user_input,
-                'timestamp': datetime.now().isoformat(),
-                'score': score
-            })
-        
-        
-        words = user_input.lower().split()
-        for i, word in enumerate(words):
-            if i < len(words) - 1:
-                self.word_associations[word].add(words[i + 1])
-                
-        self.patterns.append({
-                'input_pattern': '|'.join(keywords[:3]) if keywords else user_input.lower(),
-                'response': bot_response,
-                'keywords': keywords
-            })
-    
-    def get_stats(self):
-        return {
-            'total_patterns': len(self.patterns),
-            'keywords_learned': len(self.knowledge_base),
-            'associations': sum(len(v) for v in self.word_associations.values()),
-            'total_knowledge': sum(len(v) for v in self.knowledge_base.values()),
-            'conversations': self.conversation_count
-        }
-        
 class ChatBot(tk.Tk):
-    def __init__(self):
+    def __init__(self, backend='json', metrics=False, profile=None):
         super().__init__()
         
         self.title("Self-Learning AI Chatbot")
         self.geometry("1000x700")
         self.configure(bg='#1e1e1e')
         
+        self.storage = create_storage(backend)
         self.models = {
-            'Neural-1': SelfLearningAI('Neural-1'),
-            'Neural-2': SelfLearningAI('Neural-2'),
-            'Neural-3': SelfLearningAI('Neural-3'),
-            'Adaptive': SelfLearningAI('Adaptive')
+            name: self.storage.create_model(name)
+            for name in MODEL_NAMES
         }
         self.current_model = 'Neural-1'
-        self.chat_history = []
-        self.conversation_context = []
+        self.transcript = self.new_transcript()
+        self.conversation_context = deque(maxlen=10)
+        self.display_limit = 200
+        self.page_size = 50
+        self.display_entries = deque()
+        self.hidden_messages = 0
+        self.questions = {}
+        self.chat_start = 0
+        self.status_text = "● Learning: ON"
         self.last_user_message = None
         self.last_bot_response = None
+        self.last_contributors = []
+        self.ensemble = Ensemble(self.models)
+        self.workers = {}
+        self.results = queue.Queue()
+        self.pending_results = {}
+        self.next_request = 0
+        self.next_delivery = 0
+        self.latencies = deque(maxlen=500)
+        self.profile_path = profile
+        self.profiler = None
+        self.profile_lock = threading.Lock()
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        for model in self.models.values():
+            model.metrics.enabled = metrics
+        self.startup = {'import': IMPORT_SECONDS}
+        self.startup_model = self.current_model
+        self.loading = {}
         
-        self.load_knowledge()
         self.create_widgets()
-        self.after(60000, self.auto_save_knowledge)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after_idle(self.record_first_paint)
+        # Knowledge is parsed and the active model built on its worker, so
+        # messages sent before it is ready simply queue behind the load.
+        self.storage_loaded = self.get_worker(self.current_model).submit(self.load_knowledge)
+        self.ensure_loaded(self.current_model)
+        self.after(20, self.poll_results)
     
     def create_widgets(self):
         main_frame = tk.Frame(self, bg='#1e1e1e')
@@ -169,7 +80,7 @@ class ChatBot(tk.Tk):
                 font=('Arial', 10, 'bold')).pack(side=tk.LEFT, padx=5, pady=5)
         self.model_var = tk.StringVar(value=self.current_model)
         model_menu = ttk.Combobox(control_frame, textvariable=self.model_var, 
-                                 values=list(self.models.keys()), state='readonly', width=15)
+                                 values=list(self.models.keys()) + [ENSEMBLE_NAME], state='readonly', width=15)
         model_menu.pack(side=tk.LEFT, padx=5)
         model_menu.bind('<<ComboboxSelected>>', self.change_model)
         self.learning_label = tk.Label(control_frame, text="● Learning: ON", 
@@ -201,6 +112,9 @@ class ChatBot(tk.Tk):
         self.chat_display.tag_config('bot', foreground='#2196F3', font=('Consolas', 10, 'bold'))
         self.chat_display.tag_config('system', foreground='#FF9800', font=('Consolas', 9, 'italic'))
         self.chat_display.tag_config('learn', foreground='#9C27B0', font=('Consolas', 9, 'italic'))
+        self.chat_display.tag_config('more', foreground='#888888', font=('Consolas', 9, 'underline'))
+        self.chat_display.tag_bind('more', '<Button-1>', self.show_earlier)
+        self.reset_display()
         
         input_frame = tk.Frame(main_frame, bg='#2d2d2d', relief=tk.RAISED, bd=2)
         input_frame.pack(fill=tk.X)
@@ -230,34 +144,79 @@ class ChatBot(tk.Tk):
         self.add_system_message("🤖 Self-Learning AI Chatbot Ready!")
         self.add_system_message("I learn from every conversation. Just start chatting!")
     
-    def add_message(self, sender, message):
+    def add_message(self, sender, message, reply_to=None):
+        role = 'user' if sender == 'user' else 'assistant'
+        now = datetime.now()
+        index = self.transcript.append(role, message, now.isoformat(), reply_to)
+        self.add_entry(self.render_message(role, message, now.strftime("%H:%M:%S")), index)
+        return index
+    
+    def add_system_message(self, message):
+        self.add_entry([(f"[SYSTEM] {message}\n\n", 'system')])
+    
+    def add_learning_message(self, message):
+        self.add_entry([(f"[LEARNING] {message}\n\n", 'learn')])
+    
+    def render_message(self, role, content, timestamp):
+        if role == 'user':
+            return [(f"[{timestamp}] You: ", 'user'), (f"{content}\n\n", ())]
+        return [(f"[{timestamp}] AI: ", 'bot'), (f"{content}\n\n", ())]
+    
+    def add_entry(self, segments, index=None):
+        # Line 1 of the display is the "earlier messages" link; entries start at line 2.
+        # index is the message's line in the transcript, None for system lines,
+        # and hidden_messages counts the transcript lines above the display.
         self.chat_display.config(state=tk.NORMAL)
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        if sender == 'user':
-            self.chat_display.insert(tk.END, f"[{timestamp}] You: ", 'user')
-            self.chat_display.insert(tk.END, f"{message}\n\n")
-        elif sender == 'bot':
-            self.chat_display.insert(tk.END, f"[{timestamp}] AI: ", 'bot')
-            self.chat_display.insert(tk.END, f"{message}\n\n")
-        
+        self.chat_display.insert(tk.END, *[part for segment in segments for part in segment])
+        self.display_entries.append((sum(text.count('\n') for text, _ in segments), index))
+        
+        if len(self.display_entries) > self.display_limit:
+            while len(self.display_entries) > self.display_limit:
+                lines, trimmed = self.display_entries.popleft()
+                self.chat_display.delete('2.0', f'{2 + lines}.0')
+                if trimmed is not None:
+                    self.hidden_messages = trimmed + 1
+            self.update_more_line()
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(tk.END)
     
-    def add_system_message(self, message):
+    def update_more_line(self):
+        self.chat_display.delete('1.0', '2.0')
+        if self.hidden_messages:
+            self.chat_display.insert('1.0', f"⬆ {self.hidden_messages} earlier messages, click to show more\n", 'more')
+        else:
+            self.chat_display.insert('1.0', "\n")
+    
+    def show_earlier(self, event=None):
+        # Paged-back messages are trimmed again as soon as new ones arrive.
+        stop = min(self.hidden_messages, len(self.transcript))
+        start = max(0, stop - self.page_size)
+        messages = self.transcript.read(start, stop)
         self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, f"[SYSTEM] {message}\n\n", 'system')
+        for index, message in reversed(list(enumerate(messages, start))):
+            timestamp = datetime.fromisoformat(message['timestamp']).strftime("%H:%M:%S")
+            segments = self.render_message(message['role'], message['content'], timestamp)
+            self.chat_display.insert('2.0', *[part for segment in segments for part in segment])
+            self.display_entries.appendleft((sum(text.count('\n') for text, _ in segments), index))
+        self.hidden_messages = start
+        self.update_more_line()
         self.chat_display.config(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
+        self.chat_display.see('1.0')
     
-    def add_learning_message(self, message):
+    def reset_display(self):
         self.chat_display.config(state=tk.NORMAL)
-        self.chat_display.insert(tk.END, f"[LEARNING] {message}\n\n", 'learn')
+        self.chat_display.delete('1.0', tk.END)
+        self.chat_display.insert('1.0', "\n")
         self.chat_display.config(state=tk.DISABLED)
-        self.chat_display.see(tk.END)
+        self.display_entries.clear()
+        self.hidden_messages = 0
+    
+    def new_transcript(self):
+        return Transcript(f"chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
     
     def send_message(self, event=None):
         """Send user message"""
+        started = time.perf_counter()
         if event and event.keysym == 'Return':
             if event.state & 0x1:
                 return
@@ -265,60 +224,165 @@ class ChatBot(tk.Tk):
         message = self.input_field.get("1.0", tk.END).strip()
         
         if message:
-            self.add_message('user', message)
-            self.last_user_message = message
+            question = self.add_message('user', message)
             self.input_field.delete("1.0", tk.END)
-            self.get_ai_response(message)
+            self.get_ai_response(message, started, question)
         
         if event:
             return 'break'
     
-    def get_ai_response(self, user_message):
+    def get_worker(self, model_name):
+        if model_name not in self.workers:
+            self.workers[model_name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"model-{model_name}")
+        return self.workers[model_name]
+    
+    def submit(self, model_name, func, *args):
+        if self.profiler:
+            return self.get_worker(model_name).submit(self.profiled, func, *args)
+        return self.get_worker(model_name).submit(func, *args)
+    
+    def profiled(self, func, *args):
+        # One profiler for all workers, so profiled turns run one at a time.
+        with self.profile_lock:
+            return self.profiler.runcall(func, *args)
+    
+    def get_ai_response(self, user_message, started=None, question=None):
+        request_id = self.next_request
+        self.next_request += 1
+        self.questions[request_id] = question
+        context = list(self.conversation_context)[-5:]
+        started = started or time.perf_counter()
+        if self.current_model == ENSEMBLE_NAME:
+            self.submit(ENSEMBLE_NAME, self.run_ensemble_turn, request_id, user_message, context, started)
+        else:
+            self.submit(self.current_model, self.run_turn, request_id, self.current_model, user_message, context, started)
+        self.update_thinking()
+    
+    def run_turn(self, request_id, model_name, user_message, context, started):
+        result = {'id': request_id, 'model': model_name, 'message': user_message, 'started': started}
         try:
-            model = self.models[self.current_model]
-            response = model.generate_response(user_message, self.conversation_context[-5:])
-            self.add_message('bot', response)
-            self.last_bot_response = response
-            self.chat_history.append({
-                'role': 'user', 
-                'content': user_message, 
-                'timestamp': datetime.now().isoformat()
-            })
-            self.chat_history.append({
-                'role': 'assistant', 
-                'content': response, 
-                'timestamp': datetime.now().isoformat()
-            })
-            
-            self.conversation_context.append(user_message)
-            self.conversation_context.append(response)
-            model.learn_from_conversation(user_message, response)
-            stats = model.get_stats()
-            self.add_learning_message(
-                f"✓ Learned! Knowledge: {stats['keywords_learned']} concepts | "
-                f"{stats['total_patterns']} patterns | {stats['conversations']} chats"
-            )
-            
+            model = self.models[model_name]
+            result['response'] = model.generate_response(user_message, context)
+            model.learn_from_conversation(user_message, result['response'])
+            result['stats'] = model.get_stats()
+        except Exception as e:
+            result['error'] = e
+        result['computed'] = time.perf_counter()
+        self.results.put(result)
+    
+    def run_ensemble_turn(self, request_id, user_message, context, started):
+        result = {'id': request_id, 'model': ENSEMBLE_NAME, 'message': user_message, 'started': started}
+        try:
+            for future in [self.loading[model_name] for model_name in self.models]:
+                future.result()
+            candidates = self.ensemble.candidates(user_message, context)
+            if not candidates:
+                raise RuntimeError("No model answered in time")
+            winner = candidates[0]
+            result['response'] = winner['response']
+            result['winner'] = winner
+            result['contributors'] = [candidate['model'] for candidate in candidates]
+            self.ensemble.learn_from_conversation(candidates, user_message, winner['response'])
+            result['stats'] = self.models[winner['model']].get_stats()
         except Exception as e:
-            self.add_system_message(f"Error: {str(e)}")
-            print(f"Error in get_ai_response: {e}")
+            result['error'] = e
+        result['computed'] = time.perf_counter()
+        self.results.put(result)
+    
+    def poll_results(self):
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.pending_results[result['id']] = result
+        
+        while self.next_delivery in self.pending_results:
+            self.deliver_result(self.pending_results.pop(self.next_delivery))
+            self.next_delivery += 1
+        if 'ready' not in self.startup and self.loading[self.startup_model].done():
+            self.report_startup()
+        self.update_thinking()
+        self.after(20, self.poll_results)
+    
+    def deliver_result(self, result):
+        question = self.questions.pop(result['id'], None)
+        if result['id'] < self.chat_start:
+            # Asked in a chat that has since been replaced.
+            return
+        if 'error' in result:
+            self.add_system_message(f"Error: {str(result['error'])}")
+            print(f"Error in get_ai_response: {result['error']}")
+            return
+        
+        user_message, response = result['message'], result['response']
+        self.add_message('bot', response, question)
+        self.last_user_message = user_message
+        self.last_bot_response = response
+        self.last_contributors = result.get('contributors', [result['model']])
+        
+        self.conversation_context.append(user_message)
+        self.conversation_context.append(response)
+        stats = result['stats']
+        self.status_text = (f"✓ Learned | {stats['keywords_learned']} concepts | "
+                            f"{stats['total_patterns']} patterns | {stats['conversations']} chats")
+        if 'winner' in result:
+            winner = result['winner']
+            self.status_text += (f" | 🏆 {winner['model']} ({winner['source']}), "
+                                 f"{len(result['contributors'])}/{len(self.models)} learned")
+        self.after_idle(self.record_latency, result)
+    
+    def record_latency(self, result):
+        rendered = time.perf_counter()
+        self.latencies.append((result['computed'] - result['started'], rendered - result['started']))
+    
+    def latency_summary(self):
+        if not self.latencies:
+            return None
+        compute = sorted(c for c, _ in self.latencies)
+        render = sorted(r for _, r in self.latencies)
+        percentile = lambda values, p: values[min(len(values) - 1, int(len(values) * p))] * 1000
+        return {
+            'samples': len(render),
+            'compute_p50': percentile(compute, 0.5),
+            'render_p50': percentile(render, 0.5),
+            'render_p95': percentile(render, 0.95),
+            'render_max': render[-1] * 1000,
+        }
+    
+    def update_thinking(self):
+        if self.next_request > self.next_delivery:
+            self.learning_label.config(text="● Thinking...", fg='#FF9800')
+        else:
+            self.learning_label.config(text=self.status_text, fg='#4CAF50')
     
     def give_feedback(self, feedback_type):
         if self.last_user_message and self.last_bot_response:
-            model = self.models[self.current_model]
-            model.learn_from_conversation(self.last_user_message, self.last_bot_response, feedback_type)
+            for model_name in self.last_contributors:
+                model = self.models[model_name]
+                self.submit(
+                    model_name, model.learn_from_conversation, self.last_user_message, self.last_bot_response, feedback_type)
             
             if feedback_type == 'positive':
                 self.add_learning_message("👍 Great! I'll remember this response works well!")
             else:
                 self.add_learning_message("👎 Noted! I'll try to improve next time!")
-            
-            self.save_knowledge()
         else:
             self.add_system_message("No recent message to rate")
             
     def change_model(self, event=None):
         self.current_model = self.model_var.get()
+        if self.current_model == ENSEMBLE_NAME:
+            for model_name in self.models:
+                self.ensure_loaded(model_name)
+            self.add_system_message(
+                f"Switched to {ENSEMBLE_NAME} | Every message goes to all {len(self.models)} models, "
+                f"the best answer wins"
+            )
+            return
+        if not self.ensure_loaded(self.current_model).done():
+            self.add_system_message(f"Switched to {self.current_model} | Loading its knowledge...")
+            return
         stats = self.models[self.current_model].get_stats()
         self.add_system_message(
             f"Switched to {self.current_model} | "
@@ -326,6 +390,9 @@ class ChatBot(tk.Tk):
         )
     
     def show_stats(self):
+        # Models still loading fill the window in when they are ready, so the
+        # Tk thread never waits on a load.
+        futures = {model_name: self.ensure_loaded(model_name) for model_name in self.models}
         stats_window = tk.Toplevel(self)
         stats_window.title("AI Learning Statistics")
         stats_window.geometry("600x450")
@@ -338,8 +405,38 @@ class ChatBot(tk.Tk):
                                                bg='#2d2d2d', fg='white', 
                                                font=('Consolas', 10))
         stats_text.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        stats_text.insert(tk.END, "\n  Loading models...\n")
+        stats_text.config(state=tk.DISABLED)
         
+        button_frame = tk.Frame(stats_window, bg='#1e1e1e')
+        button_frame.pack(pady=10)
+        toggle_text = "Disable Metrics" if self.metrics_enabled() else "Enable Metrics"
+        tk.Button(button_frame, text=toggle_text,
+                 command=lambda: (self.toggle_metrics(), stats_window.destroy(), self.show_stats()),
+                 bg='#2196F3', fg='white', font=('Arial', 10, 'bold'),
+                 relief=tk.FLAT, padx=20, pady=8).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Export Metrics", command=self.export_metrics,
+                 bg='#2196F3', fg='white', font=('Arial', 10, 'bold'),
+                 relief=tk.FLAT, padx=20, pady=8).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Close", command=stats_window.destroy,
+                 bg='#f44336', fg='white', font=('Arial', 10, 'bold'),
+                 relief=tk.FLAT, padx=20, pady=8).pack(side=tk.LEFT, padx=5)
+        self.after(20, self.fill_stats, stats_window, stats_text, futures)
+    
+    def fill_stats(self, stats_window, stats_text, futures):
+        if not stats_window.winfo_exists():
+            return
+        if not all(future.done() for future in futures.values()):
+            self.after(50, self.fill_stats, stats_window, stats_text, futures)
+            return
+        
+        stats_text.config(state=tk.NORMAL)
+        stats_text.delete('1.0', tk.END)
         for model_name, model in self.models.items():
+            error = futures[model_name].exception()
+            if error:
+                stats_text.insert(tk.END, f"\n  ⚠ {model_name} could not be loaded: {error}\n")
+                continue
             stats = model.get_stats()
             stats_text.insert(tk.END, f"\n{'='*60}\n")
             stats_text.insert(tk.END, f"  MODEL: {model_name}\n")
@@ -348,74 +445,155 @@ class ChatBot(tk.Tk):
             stats_text.insert(tk.END, f"  🧩 Response Patterns:     {stats['total_patterns']}\n")
             stats_text.insert(tk.END, f"  🔗 Word Associations:     {stats['associations']}\n")
             stats_text.insert(tk.END, f"  💡 Total Knowledge Items: {stats['total_knowledge']}\n")
-            stats_text.insert(tk.END, f"  💬 Conversations:         {stats['conversations']}\n\n")
+            stats_text.insert(tk.END, f"  💬 Conversations:         {stats['conversations']}\n")
+            lookups = stats['cache_hits'] + stats['cache_misses']
+            if lookups:
+                stats_text.insert(tk.END, f"  ⚡ Analysis Cache:        {stats['cache_hits']} hits / "
+                                          f"{stats['cache_misses']} misses ({stats['cache_hits'] / lookups:.0%})\n")
+            if model.last_compaction:
+                report = model.last_compaction
+                stats_text.insert(tk.END, f"  🧹 Last Compaction:       -{report['knowledge']} knowledge, "
+                                          f"-{report['patterns']} patterns, -{report['contexts']} contexts, "
+                                          f"-{report['associations']} associations\n")
+            stats_text.insert(tk.END, "\n")
+        
+        latency = self.latency_summary()
+        if latency:
+            stats_text.insert(tk.END, f"\n{'='*60}\n")
+            stats_text.insert(tk.END, f"  RESPONSIVENESS (last {latency['samples']} messages)\n")
+            stats_text.insert(tk.END, f"{'='*60}\n\n")
+            stats_text.insert(tk.END, f"  ⚙ Model time p50:         {latency['compute_p50']:.1f} ms\n")
+            stats_text.insert(tk.END, f"  ⏱ Send-to-render p50:     {latency['render_p50']:.1f} ms\n")
+            stats_text.insert(tk.END, f"  ⏱ Send-to-render p95:     {latency['render_p95']:.1f} ms\n")
+            stats_text.insert(tk.END, f"  ⏱ Send-to-render max:     {latency['render_max']:.1f} ms\n\n")
         
-        stats_text.config(state=tk.DISABLED)
+        if self.metrics_enabled():
+            self.insert_metrics(stats_text)
         
-        tk.Button(stats_window, text="Close", command=stats_window.destroy,
-                 bg='#f44336', fg='white', font=('Arial', 10, 'bold'),
-                 relief=tk.FLAT, padx=20, pady=8).pack(pady=10)
+        stats_text.config(state=tk.DISABLED)
+    
+    def metrics_enabled(self):
+        return any(model.metrics.enabled for model in self.models.values())
+    
+    def toggle_metrics(self):
+        enabled = not self.metrics_enabled()
+        for model in self.models.values():
+            model.metrics.reset()
+            model.metrics.enabled = enabled
+    
+    def insert_metrics(self, stats_text):
+        bars = ' ▁▂▃▄▅▆▇█'
+        buckets = ['<10µs', '<30µs', '<100µs', '<300µs', '<1ms', '<3ms', '<10ms', '<30ms', '≥30ms']
+        stats_text.insert(tk.END, f"\n{'='*60}\n")
+        window = self.models[MODEL_NAMES[0]].metrics.window
+        stats_text.insert(tk.END, f"  PERFORMANCE (last {window} samples per stage)\n")
+        stats_text.insert(tk.END, f"{'='*60}\n")
+        stats_text.insert(tk.END, f"  histogram buckets: {' '.join(buckets)}\n")
+        for model_name, model in self.models.items():
+            summary = model.metrics.summary()
+            memory = model.memory_usage()
+            stats_text.insert(tk.END, f"\n  {model_name}  (~{memory['total'] / 1e6:.1f} MB: "
+                                      f"knowledge {memory['knowledge'] / 1e6:.1f}, "
+                                      f"patterns {memory['patterns'] / 1e6:.1f}, "
+                                      f"associations {memory['associations'] / 1e6:.1f}, "
+                                      f"contexts {memory['contexts'] / 1e6:.1f})\n")
+            if summary['hit_rates']:
+                rates = ', '.join(f"{path} {rate:.0%}" for path, rate in summary['hit_rates'].items())
+                stats_text.insert(tk.END, f"  answered by: {rates}\n")
+            for stage, data in summary['stages'].items():
+                peak = max(data['histogram'])
+                histogram = ''.join(bars[math.ceil(count / peak * (len(bars) - 1))] for count in data['histogram'])
+                stats_text.insert(tk.END, f"  {stage:<17} |{histogram}| p50 {data['p50_us']:>8.0f}µs  "
+                                          f"p95 {data['p95_us']:>8.0f}µs  n={data['count']}\n")
+    
+    def export_metrics(self):
+        filename = f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        data = {
+            model_name: dict(model.metrics.summary(), memory=model.memory_usage(), stats=model.get_stats())
+            for model_name, model in self.models.items()
+        }
+        data['latency'] = self.latency_summary()
+        data['startup'] = self.startup
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2)
+        self.add_system_message(f"📈 Metrics saved to {filename}")
     
     def new_chat(self):
         if messagebox.askyesno("New Chat", "Start new chat? Current conversation will be cleared."):
-            self.chat_display.config(state=tk.NORMAL)
-            self.chat_display.delete("1.0", tk.END)
-            self.chat_display.config(state=tk.DISABLED)
-            self.chat_history = []
-            self.conversation_context = []
+            self.transcript.close()
+            self.transcript = self.new_transcript()
+            self.chat_start = self.next_request
+            self.questions.clear()
+            self.reset_display()
+            self.conversation_context.clear()
             self.add_system_message("✨ New chat started! I still remember everything I learned.")
     
     def save_chat(self):
-        if self.chat_history:
-            filename = f"chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(filename, 'w') as f:
-                json.dump(self.chat_history, f, indent=2)
-            self.add_system_message(f"💾 Chat saved to {filename}")
+        if len(self.transcript):
+            self.transcript.sync()
+            self.add_system_message(f"💾 Chat saved to {self.transcript.path}")
         else:
             messagebox.showinfo("Save Chat", "No chat history to save")
     
-    def save_knowledge(self):
+    def load_knowledge(self):
+        started = time.perf_counter()
+        self.storage.load(self.models, lazy=True)
+        self.storage.start()
+        self.startup['parse'] = time.perf_counter() - started
+    
+    def ensure_loaded(self, model_name):
+        # Loads run on the model's worker outside the profiler: they wait on
+        # storage_loaded, which must not be blocked by the profile lock.
+        if model_name not in self.loading:
+            self.loading[model_name] = self.get_worker(model_name).submit(self.build_model, model_name)
+        return self.loading[model_name]
+    
+    def build_model(self, model_name):
+        self.storage_loaded.result()
+        started = time.perf_counter()
+        self.storage.materialize(model_name)
+        return time.perf_counter() - started
+    
+    def record_first_paint(self):
+        self.startup['first_paint'] = time.perf_counter() - STARTED
+    
+    def report_startup(self):
         try:
-            data = {}
-            for model_name, model in self.models.items():
-                data[model_name] = {
-                    'knowledge_base': {k: list(v) for k, v in model.knowledge_base.items()},
-                    'patterns': model.patterns,
-                    'word_associations': {k: list(v) for k, v in model.word_associations.items()},
-                    'response_scores': dict(model.response_scores),
-                    'conversation_count': model.conversation_count
-                }
-            
-            with open('ai_knowledge.json', 'w') as f:
-                json.dump(data, f, indent=2)
+            self.startup['build'] = self.loading[self.startup_model].result()
         except Exception as e:
-            print(f"Error saving knowledge: {e}")
+            self.startup['build'] = 0.0
+            self.add_system_message(f"Error loading knowledge: {e}")
+        self.startup['ready'] = time.perf_counter() - STARTED
+        report = (f"import {self.startup['import'] * 1000:.0f} ms | "
+                  f"first paint {self.startup.get('first_paint', 0) * 1000:.0f} ms | "
+                  f"parse {self.startup.get('parse', 0) * 1000:.0f} ms | "
+                  f"build {self.startup['build'] * 1000:.0f} ms | "
+                  f"ready {self.startup['ready'] * 1000:.0f} ms")
+        print(f"Startup: {report}")
+        self.add_system_message(f"⚡ {self.startup_model} ready | {report}")
     
-    def load_knowledge(self):
-        if os.path.exists('ai_knowledge.json'):
-            try:
-                with open('ai_knowledge.json', 'r') as f:
-                    data = json.load(f)
-                
-                for model_name, model_data in data.items():
-                    if model_name in self.models:
-                        model = self.models[model_name]
-                        model.knowledge_base = defaultdict(list, 
-                            model_data.get('knowledge_base', {}))
-                        model.patterns.extend(model_data.get('patterns', []))
-                        model.word_associations = defaultdict(set, {
-                            k: set(v) for k, v in model_data.get('word_associations', {}).items()
-                        })
-                        model.response_scores = defaultdict(int, 
-                            model_data.get('response_scores', {}))
-                        model.conversation_count = model_data.get('conversation_count', 0)
-            except Exception as e:
-                print(f"Error loading knowledge: {e}")
-    
-    def auto_save_knowledge(self):
-        self.save_knowledge()
-        self.after(60000, self.auto_save_knowledge)
+    def on_close(self):
+        for worker in self.workers.values():
+            worker.shutdown(wait=True)
+        self.ensemble.close()
+        self.transcript.close()
+        if self.profiler:
+            self.profiler.dump_stats(self.profile_path)
+            print(f"Profile written to {self.profile_path}")
+        try:
+            self.storage.close()
+        except Exception as e:
+            print(f"Error saving knowledge: {e}")
+        self.destroy()
     
 if __name__ == "__main__":
-    app = ChatBot()
+    parser = argparse.ArgumentParser(description="Self-Learning AI Chatbot")
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json',
+                        help="keep knowledge in ai_knowledge.json or in ai_knowledge.db")
+    parser.add_argument('--metrics', action='store_true',
+                        help="record per-stage timings and hit rates (shown in Stats)")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="run model work under cProfile and write the stats to PATH on exit")
+    args = parser.parse_args()
+    app = ChatBot(backend=args.backend, metrics=args.metrics, profile=args.profile)
     app.mainloop()
\ No newline at end of file
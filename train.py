@@ -0,0 +1,183 @@
+"""Bulk offline training from saved chat transcripts.
+
+    python train.py PATH [PATH ...] [--model Neural-1] [--backend json|sqlite]
+                    [--workers N] [--chunk-size 2000]
+
+PATH is a chat_*.jsonl transcript written by the chat window, an older
+chat_*.json export, a JSONL corpus, or a directory holding any of them. JSONL lines are transcript messages
+({"role": ..., "content": ...}) or whole turns ({"user": ..., "assistant": ...,
+"feedback": ...}).
+
+Turns are streamed in chunks to worker processes, which turn each chunk into a
+knowledge fragment. Fragments are merged into the model in chunk order, so the
+result does not depend on which worker finishes first. At most a few chunks are
+in flight at once, so memory follows the chunk size, not the corpus size.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import MODEL_NAMES, KnowledgeIndex, SelfLearningAI, WordAssociations, create_storage
+
+_learner = None
+
+
+def find_sources(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, 'chat_*.json')) + glob.glob(os.path.join(path, '*.jsonl'))
+            yield from sorted(found)
+        else:
+            yield path
+
+
+def iter_messages(path):
+    if path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from json.load(f)
+
+
+def iter_turns(paths):
+    for path in find_sources(paths):
+        # Unanswered user messages by line, so a reply pairs with its reply_to
+        # line, or with the latest user message in older transcripts.
+        questions = {}
+        last_question = None
+        try:
+            for line, message in enumerate(iter_messages(path)):
+                if 'user' in message:
+                    yield message['user'], message['assistant'], message.get('feedback'), message.get('timestamp')
+                elif message.get('role') == 'user':
+                    questions[line] = message['content']
+                    last_question = line
+                elif message.get('role') == 'assistant':
+                    question = questions.pop(message.get('reply_to', last_question), None)
+                    if question is not None:
+                        yield question, message['content'], None, message.get('timestamp')
+        except (ValueError, KeyError) as e:
+            print(f"Skipping rest of {path}: {e}")
+
+
+def chunked(turns, size):
+    chunk = []
+    for turn in turns:
+        chunk.append(turn)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_fragment(chunk):
+    global _learner
+    if _learner is None:
+        _learner = SelfLearningAI('trainer')
+    knowledge = KnowledgeIndex()
+    associations = WordAssociations()
+    patterns = []
+    documents = {}
+    for user_input, bot_response, feedback, timestamp in chunk:
+        records, links, pattern, document = _learner.learning_steps(user_input, bot_response, feedback, timestamp)
+        for keyword, record in records:
+            knowledge.add(keyword, record)
+        for word, next_word in links:
+            associations.add(word, next_word)
+        patterns.append(pattern)
+        context, response, terms, score = document
+        if (context, response) in documents:
+            documents[(context, response)][3] += score
+        else:
+            documents[(context, response)] = [context, response, terms, score]
+    return {
+        'knowledge_base': dict(knowledge.items()),
+        'word_associations': dict(associations.items()),
+        'patterns': patterns,
+        'documents': list(documents.values()),
+        'turns': len(chunk),
+    }
+
+
+def merge_fragment(model, fragment):
+    with model.lock:
+        model.knowledge_base.update(fragment['knowledge_base'])
+        model.word_associations.update(fragment['word_associations'])
+        model.patterns.extend(fragment['patterns'])
+        for document in fragment['documents']:
+            model.retriever.add(*document)
+        model.conversation_count += fragment['turns']
+        model.cache.clear()
+        if model.budget.exceeded(model):
+            model.compact()
+
+
+def train(model, paths, workers=None, chunk_size=2000, progress=None):
+    chunks = chunked(iter_turns(paths), chunk_size)
+    turns = 0
+    if workers == 1:
+        for chunk in chunks:
+            fragment = build_fragment(chunk)
+            merge_fragment(model, fragment)
+            turns += fragment['turns']
+            if progress:
+                progress(turns)
+        return turns
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        max_pending = 2 * workers
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(build_fragment, chunk))
+            while len(pending) >= max_pending or (pending and pending[0].done()):
+                fragment = pending.popleft().result()
+                merge_fragment(model, fragment)
+                turns += fragment['turns']
+                if progress:
+                    progress(turns)
+        while pending:
+            fragment = pending.popleft().result()
+            merge_fragment(model, fragment)
+            turns += fragment['turns']
+            if progress:
+                progress(turns)
+    return turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a model from saved chat transcripts")
+    parser.add_argument('paths', nargs='+', help="chat_*.json / *.jsonl files or directories")
+    parser.add_argument('--model', choices=MODEL_NAMES, default=MODEL_NAMES[0])
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--knowledge', help="knowledge file (default ai_knowledge.json / ai_knowledge.db)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per CPU, 1 = in-process)")
+    parser.add_argument('--chunk-size', type=int, default=2000, help="turns per worker task")
+    args = parser.parse_args()
+
+    storage = create_storage(args.backend, args.knowledge)
+    models = {name: storage.create_model(name) for name in MODEL_NAMES}
+    storage.load(models)
+
+    started = time.perf_counter()
+    report = lambda turns: print(f"\r{turns} turns merged", end='', flush=True)
+    try:
+        turns = train(models[args.model], args.paths, args.workers, args.chunk_size, report)
+        storage.snapshot()
+        elapsed = time.perf_counter() - started
+        print(f"\rTrained {args.model} on {turns} turns in {elapsed:.1f}s ({turns / max(elapsed, 1e-9):.0f} turns/s)")
+        print(models[args.model].get_stats())
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()